@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Compare the column separator detection of gpageseg (`compute_colseps_conv`)
+with the previous implementation (pixel loops for the gap filling), copied
+below.
+
+For every binarized page, the scale is estimated and the column separators
+are computed with both implementations; the runtime and whether the
+results agree are reported.
+
+    python benchmarks/colseps.py path/to/binarized/*.png
+"""
+
+import argparse
+import time
+
+import numpy as np
+import ocrolib
+from ocrolib import psegutils, morph, sl
+from scipy.ndimage import gaussian_filter, uniform_filter, maximum_filter
+
+from ocrd_anybaseocr.gpageseg import F, default_params, compute_colseps_conv
+
+
+def legacy_compute_colseps_conv(binary, params, scale=1.0):
+    smoothed = gaussian_filter(F(binary, params['precision']), (scale, scale*0.5))
+    smoothed = uniform_filter(smoothed, (5.0*scale, 1))
+    thresh = (smoothed < np.amax(smoothed)*0.1)
+    grad = gaussian_filter(F(binary, params['precision']), (scale, scale*0.5), order=(0, 1))
+    grad = uniform_filter(grad, (10.0*scale, 1))
+    grad = (grad > 0.25*np.amax(grad))
+    grad1 = morph.select_regions(grad, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps']+10)
+    x = (1-thresh)*(1-grad1)
+    thresh11 = (1-thresh)*x
+    for r in range(0, len(thresh11)):
+        count = 0
+        for c in range(0, len(thresh11[0])):
+            if(thresh11[r][c] == 1):
+                continue
+            count += 1
+            if(c != len(thresh11[0])-1 and thresh11[r][c+1] == 1):
+                if(count <= 50):
+                    for z in range(c-count, c+1):
+                        thresh11[r][z] = 1
+                count = 0
+    y = 1-(thresh11*(1-thresh))
+    seps = np.minimum(thresh, maximum_filter(grad, (int(scale), int(5*scale))))
+    seps = maximum_filter(seps, (int(2*scale), 1))
+    smoothed = gaussian_filter(F(seps, params['precision']), (scale, scale*0.5))
+    smoothed = uniform_filter(smoothed, (5.0*scale, 1))
+    seps1 = (smoothed < np.amax(smoothed)*0.1)
+    seps1 = 1-seps1
+    seps1 = (grad)*seps1
+    for c in range(0, len(seps1[0])):
+        count = 0
+        for r in range(0, len(seps1)):
+            if(seps1[r][c] == 1):
+                continue
+            count += 1
+            if(r != len(seps1)-1 and seps1[r+1][c] == 1):
+                if(count <= 400):
+                    for z in range(r-count, r+1):
+                        seps1[z][c] = 1
+                count = 0
+    seps1 = morph.select_regions(seps1, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps']+10)
+    seps1 = (seps1*(1-y))+seps1
+    for c in range(0, len(seps1[0])):
+        for r in range(0, len(seps1)):
+            if(seps1[r][c] != 0):
+                seps1[r][c] = 1
+    for c in range(0, len(seps1[0])):
+        count = 0
+        for r in range(0, len(seps1)):
+            if(seps1[r][c] == 1):
+                continue
+            count += 1
+            if(r != len(seps1)-1 and seps1[r+1][c] == 1):
+                if(count <= 350):
+                    for z in range(r-count, r+1):
+                        seps1[z][c] = 1
+                count = 0
+    return seps1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='binarized page images')
+    args = parser.parse_args()
+
+    params = default_params()
+    for fname in args.files:
+        binary = np.array(1-ocrolib.read_image_binary(fname), 'B')
+        scale = psegutils.estimate_scale(binary)
+        start = time.time()
+        ref = legacy_compute_colseps_conv(binary, params, scale)
+        ref_time = time.time() - start
+        start = time.time()
+        out = compute_colseps_conv(binary, params, scale)
+        out_time = time.time() - start
+        print("%s: %s, %.2fs vs %.2fs (%.1fx)" % (
+            fname, "same" if np.array_equal(ref, out) else "DIFFERENT",
+            ref_time, out_time, ref_time/out_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Compare page frame detection of the cropper at full resolution with
+detection on downscaled proxies (`proxyLongEdge`), optionally refined
+(`proxyRefine`).
+
+For every image, the frame and runtime at full resolution and for each
+proxy size are reported, along with the largest deviation of an edge.
+
+    python benchmarks/crop_proxy.py --proxy 3000 1500 --refine 8 path/to/scans/*.tif
+"""
+
+import argparse
+import time
+
+import cv2
+
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_cropping import OcrdAnybaseocrCropper
+
+
+def detect(image, proxy, refine):
+    cropper = OcrdAnybaseocrCropper(None, parameter={'proxyLongEdge': proxy, 'proxyRefine': refine})
+    start = time.time()
+    border = cropper.detect_border(image.copy())
+    return border, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proxy', type=int, nargs='+', default=[3000, 2000, 1500], help='proxy long edges')
+    parser.add_argument('--refine', type=int, default=0, help='refinement band (pixels)')
+    parser.add_argument('files', nargs='+', help='page images')
+    args = parser.parse_args()
+
+    for fname in args.files:
+        image = cv2.cvtColor(cv2.imread(fname), cv2.COLOR_BGR2RGB)
+        ref, ref_time = detect(image, 0, 0)
+        print("%s: full resolution %s, %.2fs" % (fname, ref, ref_time))
+        for proxy in args.proxy:
+            border, proxy_time = detect(image, proxy, args.refine)
+            print("%s: proxy %d %s, %.2fs (%.1fx), edges deviate by up to %dpx" % (
+                fname, proxy, border, proxy_time, ref_time/proxy_time,
+                max(abs(a - b) for a, b in zip(ref, border))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Compare dewarping throughput on the CPU: the float32 eager generator
+against the TorchScript traced one (`jit`), for several thread counts.
+
+Every variant runs in a fresh process, which loads the generator and
+dewarps all images once (after one warm-up page). Pages per second and the
+peak resident set size of the process are reported.
+
+    python benchmarks/dewarp_cpu.py --pix2pixHD path/to/pix2pixHD \\
+        --checkpoint models/latest_net_G.pth --threads 1 4 path/to/crops/*.png
+"""
+
+import argparse
+import resource
+import time
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import Image
+
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_dewarp import OcrdAnybaseocrDewarper
+
+
+def run(parameter, files):
+    dewarper = OcrdAnybaseocrDewarper(None, parameter=parameter)
+    dewarper.load_generator(parameter['pix2pixHD'])
+    images = [np.asarray(Image.open(fname).convert('RGB')) for fname in files]
+    dewarper.dewarp(images[0])
+    start = time.time()
+    for image in images:
+        dewarper.dewarp(image)
+    elapsed = time.time() - start
+    # kilobytes on Linux
+    return len(images) / elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pix2pixHD', required=True, help='path to the pix2pixHD repository')
+    parser.add_argument('--checkpoint', default='models/latest_net_G.pth', help='generator weights')
+    parser.add_argument('--threads', type=int, nargs='+', default=[0], help='thread counts (0: torch default)')
+    parser.add_argument('files', nargs='+', help='cropped page images')
+    args = parser.parse_args()
+
+    ctx = get_context('spawn')
+    for threads in args.threads:
+        for jit in (False, True):
+            parameter = {'pix2pixHD': args.pix2pixHD, 'checkpoint': args.checkpoint,
+                         'gpu_id': -1, 'threads': threads, 'jit': jit}
+            with ctx.Pool(1) as pool:
+                rate, rss = pool.apply(run, (parameter, args.files))
+            print("threads %d, %s: %.3f pages/s, peak RSS %.0f MiB" % (
+                threads, "traced" if jit else "eager", rate, rss))
+
+
+if __name__ == '__main__':
+    main()
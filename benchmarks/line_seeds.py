@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Compare the line seed marking of gpageseg (`mark_line_seeds`) with the
+previous implementation (one sorted transition list per column), copied
+below.
+
+For every binarized page (preferably wide ones, e.g. newspapers), the
+baseline and xheight candidates are computed as in `compute_line_seeds`
+and the seeds are marked with both implementations; the runtime, whether
+the seeds agree, and the share of the whole segmentation (`segment`) are
+reported.
+
+    python benchmarks/line_seeds.py path/to/binarized/*.png
+"""
+
+import argparse
+import time
+
+import numpy as np
+import ocrolib
+from ocrolib import psegutils
+from scipy.ndimage import maximum_filter
+
+from ocrd_anybaseocr.gpageseg import (default_params, remove_hlines, compute_colseps,
+                                      compute_gradmaps, mark_line_seeds, segment)
+
+
+def legacy_mark_line_seeds(bmarked, tmarked, delta, scale):
+    seeds = np.zeros(bmarked.shape, 'i')
+    for x in range(bmarked.shape[1]):
+        transitions = sorted([(y, 1) for y in psegutils.find(bmarked[:, x])]+[(y, 0) for y in psegutils.find(tmarked[:, x])])[::-1]
+        transitions += [(0, 0)]
+        for l in range(len(transitions)-1):
+            y0, s0 = transitions[l]
+            if s0 == 0:
+                continue
+            seeds[y0-delta:y0, x] = 1
+            y1, s1 = transitions[l+1]
+            if s1 == 0 and (y0-y1) < 5*scale:
+                seeds[y1:y0, x] = 1
+    return seeds
+
+
+def candidates(binary, scale, params):
+    """Baseline and xheight candidates as in compute_line_seeds."""
+    binary = remove_hlines(np.array(binary, 'B'), scale)
+    colseps, binary = compute_colseps(binary, scale, params)
+    bottom, top, _ = compute_gradmaps(binary, scale, params)
+    t = params['threshold']
+    vrange = int(params['vscale']*scale)
+    bmarked = maximum_filter(bottom == maximum_filter(bottom, (vrange, 0)), (2, 2))
+    bmarked *= np.array((bottom > t*np.amax(bottom)*t)*(1-colseps), dtype=bool)
+    tmarked = maximum_filter(top == maximum_filter(top, (vrange, 0)), (2, 2))
+    tmarked *= np.array((top > t*np.amax(top)*t/2)*(1-colseps), dtype=bool)
+    tmarked = maximum_filter(tmarked, (1, 20))
+    return bmarked, tmarked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='binarized page images')
+    args = parser.parse_args()
+
+    params = default_params()
+    for fname in args.files:
+        binary = np.array(1-ocrolib.read_image_binary(fname), 'B')
+        scale = psegutils.estimate_scale(binary)
+        delta = max(3, int(scale/2))
+        bmarked, tmarked = candidates(binary, scale, params)
+        start = time.time()
+        ref = legacy_mark_line_seeds(bmarked, tmarked, delta, scale)
+        ref_time = time.time() - start
+        start = time.time()
+        out = mark_line_seeds(bmarked, tmarked, delta, 5*scale)
+        out_time = time.time() - start
+        start = time.time()
+        segment(binary, dict(params, scale=scale, maxlines=100000))
+        total_time = time.time() - start
+        print("%s: %s, %.2fs vs %.2fs (%.1fx), %.1f%% of segmentation (%.2fs)" % (
+            fname, "same" if np.array_equal(ref, out) else "DIFFERENT",
+            ref_time, out_time, ref_time/out_time, 100*out_time/total_time, total_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Quantify how much the reduced-precision processing paths disagree with
+float64 processing on a sample corpus.
+
+For every image, the binarizer and the deskewer are run once with
+`precision=float64` and once with each lower precision; the fraction of
+pixels that differ in the thresholded output is reported, along with the
+lo/hi estimates, the skew angle and the runtime.
+
+    python benchmarks/precision.py path/to/images/*.png
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_binarize import OcrdAnybaseocrBinarizer
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_deskew import OcrdAnybaseocrDeskewer
+
+PRECISIONS = ['float32']
+
+
+def disagreement(a, b):
+    h, w = np.minimum(a.shape, b.shape)
+    return np.mean(a[:h, :w] != b[:h, :w])
+
+
+def binarize(fname, precision):
+    binarizer = OcrdAnybaseocrBinarizer(None, parameter={'nocheck': True, 'precision': precision})
+    start = time.time()
+    binary, lo, hi, _ = binarizer._process_segment(fname, fname)
+    return binary.array, (lo, hi), time.time() - start
+
+
+def deskew(fname, precision):
+    deskewer = OcrdAnybaseocrDeskewer(None, parameter={'precision': precision})
+    start = time.time()
+    deskewed, angle = deskewer._deskew(fname)
+    return deskewed, angle, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='sample page images')
+    args = parser.parse_args()
+
+    worst = {}
+    for fname in args.files:
+        ref_bin, ref_lohi, ref_btime = binarize(fname, 'float64')
+        ref_ds, ref_angle, ref_dtime = deskew(fname, 'float64')
+        for precision in PRECISIONS:
+            out_bin, lohi, btime = binarize(fname, precision)
+            out_ds, angle, dtime = deskew(fname, precision)
+            bin_diff = disagreement(ref_bin, out_bin)
+            ds_diff = disagreement(ref_ds, out_ds)
+            print("%s %s: binarize %.5f%% differ, lo-hi (%.4f %.4f) vs (%.4f %.4f), %.2fs vs %.2fs" % (
+                fname, precision, 100*bin_diff, ref_lohi[0], ref_lohi[1], lohi[0], lohi[1], ref_btime, btime))
+            print("%s %s: deskew %.5f%% differ, angle %.3f vs %.3f, %.2fs vs %.2fs" % (
+                fname, precision, 100*ds_diff, ref_angle, angle, ref_dtime, dtime))
+            worst[precision] = max(worst.get(precision, 0), bin_diff, ds_diff)
+    for precision, diff in worst.items():
+        print("%s: at most %.5f%% of pixels differ from float64" % (precision, 100*diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compare the text area detection of the cropper with the previous
+implementation (one contour drawing per component), copied below.
+
+For every image (preferably dense pages, e.g. newspapers), the ruler is
+removed and the text area boxes are detected with both implementations;
+the runtime and whether the boxes agree are reported.
+
+    python benchmarks/textarea.py path/to/images/*.png
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_cropping import OcrdAnybaseocrCropper
+
+
+def legacy_detect_textarea(cropper, arg):
+    textarea = []
+    small = cv2.cvtColor(arg, cv2.COLOR_RGB2GRAY)
+    height, width, _ = arg.shape
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    grad = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, kernel)
+
+    _, bw = cv2.threshold(
+        grad, 0.0, 255.0, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (10, 1))  # for historical docs
+    connected = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(
+        connected.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+
+    mask = np.zeros(bw.shape, dtype=np.uint8)
+
+    for idx in range(len(contours)):
+        x, y, w, h = cv2.boundingRect(contours[idx])
+        mask[y:y+h, x:x+w] = 0
+        cv2.drawContours(mask, contours, idx, (255, 255, 255), -1)
+        r = float(cv2.countNonZero(mask[y:y+h, x:x+w])) / (w * h)
+
+        if r > 0.45 and (width*0.9) > w > 15 and (height*0.5) > h > 15:
+            textarea.append([x, y, x+w-1, y+h-1])
+            cv2.rectangle(arg, (x, y), (x+w-1, y+h-1), (0, 0, 255), 2)
+
+    if len(textarea) > 1:
+        textarea = cropper.filter_noisebox(textarea, height, width)
+
+    return textarea, arg, height, width
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='page images')
+    args = parser.parse_args()
+
+    cropper = OcrdAnybaseocrCropper(None, parameter={})
+    for fname in args.files:
+        image = cropper.remove_rular(cv2.cvtColor(cv2.imread(fname), cv2.COLOR_BGR2RGB))
+        start = time.time()
+        ref = legacy_detect_textarea(cropper, image.copy())[0]
+        ref_time = time.time() - start
+        start = time.time()
+        out = cropper.detect_textarea(image.copy())[0]
+        out_time = time.time() - start
+        print("%s: %d boxes, %s, %.2fs vs %.2fs (%.1fx)" % (
+            fname, len(ref), "same" if ref == out else "DIFFERENT",
+            ref_time, out_time, ref_time/out_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Compare the text/non-text segmentation core of the tiseg processor with
+the previous (loop based) implementation, copied below.
+
+For every binarized image, the image mask (after dilation and expansion
+to page size) is computed with both implementations; the runtime and the
+number of differing pixels are reported.
+
+    python benchmarks/tiseg.py path/to/binarized/*.png
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+import ocrolib
+from PIL import Image
+from scipy import ndimage
+
+from ocrd_anybaseocr.binary import BinaryImage
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_tiseg import OcrdAnybaseocrTiseg
+
+
+class LegacyTiseg(object):
+    """The segmentation core as it was before vectorization."""
+
+    def pixMorphSequence_mask_seed_fill_holes(self, I):
+        Imask = self.reduction_T_1(I)
+        Imask = self.reduction_T_1(Imask)
+        Imask = ndimage.binary_fill_holes(Imask)
+        Iseed = self.reduction_T_4(Imask)
+        Iseed = self.reduction_T_3(Iseed)
+        mask = np.array(np.ones((5, 5)), dtype=int)
+        Iseed = ndimage.binary_opening(Iseed, mask)
+        Iseed = self.expansion(Iseed, Imask.shape)
+        return Imask, Iseed
+
+    def pixSeedfillBinary(self, Imask, Iseed):
+        Iseedfill = copy.deepcopy(Iseed)
+        s = np.ones((3, 3))
+        Ijmask, k = ndimage.label(Imask, s)
+        Ijmask2 = Ijmask * Iseedfill
+        A = list(np.unique(Ijmask2))
+        A.remove(0)
+        for i in range(0, len(A)):
+            x, y = np.where(Ijmask == A[i])
+            Iseedfill[x, y] = 1
+        return Iseedfill
+
+    def reduction_T_1(self, I):
+        A = np.logical_or(I[0:-1:2, :], I[1::2, :])
+        A = np.logical_or(A[:, 0:-1:2], A[:, 1::2])
+        return A
+
+    def reduction_T_3(self, I):
+        A = np.logical_or(I[0:-1:2, :], I[1::2, :])
+        A = np.logical_and(A[:, 0:-1:2], A[:, 1::2])
+        B = np.logical_and(I[0:-1:2, :], I[1::2, :])
+        B = np.logical_or(B[:, 0:-1:2], B[:, 1::2])
+        C = np.logical_and(A, B)
+        return C
+
+    def reduction_T_4(self, I):
+        A = np.logical_and(I[0:-1:2, :], I[1::2, :])
+        A = np.logical_and(A[:, 0:-1:2], A[:, 1::2])
+        return A
+
+    def expansion(self, I, rows_cols):
+        r, c = I.shape
+        rows, cols = rows_cols
+        A = np.zeros((rows, cols))
+        for i in range(0, 4):
+            for j in range(0, 4):
+                A[i:4*r:4, j:4*c:4] = I
+        return A
+
+
+def image_mask(tiseg, I):
+    rows, cols = I.shape
+    Imask, Iseed = tiseg.pixMorphSequence_mask_seed_fill_holes(I)
+    Iseedfill = tiseg.pixSeedfillBinary(Imask, Iseed)
+    Iseedfill = ndimage.binary_dilation(Iseedfill, np.ones((3, 3)))
+    return tiseg.expansion(Iseedfill, (rows, cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='binarized page images')
+    args = parser.parse_args()
+
+    legacy = LegacyTiseg()
+    tiseg = OcrdAnybaseocrTiseg(None, parameter={})
+    for fname in args.files:
+        image = Image.open(fname)
+        I = ocrolib.pil2array(image.convert('L'))
+        B = BinaryImage.from_pil(image).array
+        start = time.time()
+        ref = image_mask(legacy, 1-I/float(I.max()))
+        ref_time = time.time() - start
+        start = time.time()
+        out = image_mask(tiseg, B)
+        out_time = time.time() - start
+        print("%s: %d pixels differ, %.2fs vs %.2fs (%.1fx)" % (
+            fname, np.count_nonzero((ref != 0) != out), ref_time, out_time, ref_time/out_time))
+
+
+if __name__ == '__main__':
+    main()
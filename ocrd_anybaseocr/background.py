@@ -0,0 +1,123 @@
+"""
+Estimation of the local page background (whitelevel) for flattening.
+
+The reference algorithm is the one from ocropus-nlbin: the page is zoomed
+down, filtered with two separable percentile filters and zoomed back up.
+The other methods approximate it at a fraction of the cost:
+
+* ``block``: percentile over a grid of non-overlapping blocks, bilinearly
+  interpolated between the block centers,
+* ``morph``: grayscale closing (maximum followed by minimum filter), which
+  removes dark print smaller than the window just like a high percentile.
+
+Both operate on the full-resolution page directly, with the window extent
+of the reference filters (``range/zoom`` pixels), so no zooming is needed.
+"""
+
+import numpy as np
+from scipy.ndimage import filters, interpolation
+
+from ocrd_utils import getLogger
+
+__all__ = ['METHODS', 'estimate_background', 'background_halo', 'check_background']
+
+LOG = getLogger('ocrd_anybaseocr.background')
+
+
+def _percentile(image, perc, range_, zoom, origin=None, shape=None):
+    if shape is None:
+        m = interpolation.zoom(image, zoom)
+    else:
+        # sample the tile on the grid that zooming the whole page would use
+        small = [int(round(n*zoom)) for n in shape]
+        down = [(n-1)/float(k-1) for n, k in zip(shape, small)]
+        start = [int(np.ceil(o/d)) for o, d in zip(origin, down)]
+        stop = [int(np.floor((o+n-1)/d)) + 1 for o, n, d in zip(origin, image.shape, down)]
+        m = interpolation.affine_transform(
+            image, down, offset=[i*d-o for i, d, o in zip(start, down, origin)],
+            output_shape=[b-a for a, b in zip(start, stop)])
+    m = filters.percentile_filter(m, perc, size=(range_, 2))
+    m = filters.percentile_filter(m, perc, size=(2, range_))
+    if shape is None:
+        return interpolation.zoom(m, 1.0/zoom)
+    big = [int(round(k/zoom)) for k in small]
+    up = [(k-1)/float(n-1) for k, n in zip(small, big)]
+    return interpolation.affine_transform(
+        m, up, offset=[o*u-i for o, u, i in zip(origin, up, start)],
+        output_shape=image.shape)
+
+
+def _upsample(grid, size, block, offset):
+    """Bilinearly interpolate `grid` (values at block centers) to `size`."""
+    for axis, n in enumerate(size):
+        pos = (np.arange(n) + offset[axis] + 0.5) / block - 0.5
+        pos = np.clip(pos, 0, grid.shape[axis] - 1)
+        i0 = pos.astype(int)
+        i1 = np.minimum(i0 + 1, grid.shape[axis] - 1)
+        f = (pos - i0).astype(grid.dtype)
+        if axis == 0:
+            grid = grid[i0] * (1 - f)[:, None] + grid[i1] * f[:, None]
+        else:
+            grid = grid[:, i0] * (1 - f) + grid[:, i1] * f
+    return grid
+
+
+def _block(image, perc, range_, zoom, origin=None, shape=None):
+    block = max(2, int(range_ / zoom))
+    # align the blocks with those of the whole page
+    offset = [o % block for o in origin] if origin else [0, 0]
+    h, w = image.shape
+    bh, bw = -(-(h + offset[0]) // block), -(-(w + offset[1]) // block)
+    padded = np.pad(image, ((offset[0], bh*block - h - offset[0]),
+                            (offset[1], bw*block - w - offset[1])), mode='edge')
+    blocks = padded.reshape(bh, block, bw, block).swapaxes(1, 2).reshape(bh, bw, -1)
+    grid = np.percentile(blocks, perc, axis=-1).astype(image.dtype)
+    return _upsample(grid, (h, w), block, offset)
+
+
+def _morph(image, perc, range_, zoom, origin=None, shape=None):
+    size = max(2, int(range_ / zoom))
+    m = filters.maximum_filter(image, size=(size, size))
+    return filters.minimum_filter(m, size=(size, size))
+
+
+METHODS = {
+    'percentile': _percentile,
+    'block': _block,
+    'morph': _morph,
+}
+
+
+def estimate_background(image, perc, range_, zoom, method='percentile', origin=None, shape=None):
+    """Estimate the local whitelevel of `image` with `method`.
+
+    The result may differ in shape from `image` by a few pixels (due to
+    zooming), so callers must crop both to their common size.
+
+    If `image` is a tile of a larger page, pass its `origin` within the
+    page and the page `shape`: the result then has the shape of the tile,
+    and apart from a margin of `background_halo` pixels it agrees with the
+    estimate for the whole page.
+    """
+    return METHODS[method](image, perc, range_, zoom, origin, shape)
+
+
+def background_halo(range_, zoom):
+    """Margin (in pixels) a tile needs around it for `estimate_background`."""
+    return int((2*range_ + 10) / zoom)
+
+
+def check_background(image, m, perc, range_, zoom, tolerance, origin=None, shape=None):
+    """Compare background estimate `m` against the reference method.
+
+    Returns `m` if its maximum absolute deviation from the reference is
+    within `tolerance`, otherwise logs a warning and returns the reference.
+    """
+    ref = _percentile(image, perc, range_, zoom, origin, shape)
+    h, w = np.minimum(ref.shape, m.shape)
+    err = np.amax(np.abs(ref[:h, :w] - m[:h, :w]))
+    if err > tolerance:
+        LOG.warning("background deviates by %.3f (tolerance %.3f), using percentile filter", err, tolerance)
+        return ref
+    LOG.info("background deviates by %.3f (tolerance %.3f)", err, tolerance)
+    return m
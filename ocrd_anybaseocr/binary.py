@@ -0,0 +1,154 @@
+"""
+Binary page images.
+
+A `BinaryImage` wraps a boolean array that is True for the foreground
+(ink). Slicing returns views, the logical operators and the rank reductions
+work on the boolean data directly, and the image is pickled (e.g. when it
+is passed between worker processes) and converted to and from PIL mode '1'
+as packed bits, i.e. 8 pixels per byte.
+"""
+
+import numpy as np
+from PIL import Image
+
+__all__ = ['BinaryImage', 'reduce_rank', 'midrange_threshold']
+
+
+def reduce_rank(a, level):
+    """Rank binary reduction of boolean array `a` by a factor of 2.
+
+    Every 2x2 block becomes foreground if at least `level` (1 to 4) of its
+    pixels are foreground, as in Leptonica's `pixReduceRankBinary2`. An odd
+    last row or column is dropped.
+    """
+    h, w = a.shape[0] // 2 * 2, a.shape[1] // 2 * 2
+    a = a[:h, :w]
+    if level == 1:
+        r = a[0::2] | a[1::2]
+        return r[:, 0::2] | r[:, 1::2]
+    if level == 4:
+        r = a[0::2] & a[1::2]
+        return r[:, 0::2] & r[:, 1::2]
+    # per block: both columns have foreground, or one column is full
+    either = a[0::2] | a[1::2]
+    both = a[0::2] & a[1::2]
+    spread = either[:, 0::2] & either[:, 1::2]
+    full = both[:, 0::2] | both[:, 1::2]
+    if level == 2:
+        return spread | full
+    if level == 3:
+        return spread & full
+    raise ValueError("rank reduction level must be 1 to 4, not %r" % level)
+
+
+def midrange_threshold(image):
+    """Threshold for `BinaryImage.from_pil` that makes the gray levels up to
+    the mid-range of the PIL `image` foreground, as in ocrolib's
+    `read_image_binary`."""
+    lo, hi = image.convert('L').getextrema()
+    return (lo + hi) // 2 + 1
+
+
+class BinaryImage(object):
+    """Binary image, True for the foreground.
+
+    `BinaryImage(a)` does not copy `a` if it already is a boolean array.
+    """
+
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype=bool)
+
+    @classmethod
+    def from_pil(cls, image, threshold=None):
+        """Foreground of a PIL image.
+
+        Mode '1' images are unpacked directly (black is foreground). Other
+        images are converted to grayscale, and pixels darker than
+        `threshold` are foreground; by default, everything darker than the
+        brightest pixel, which is exact for bilevel images of any mode.
+        """
+        if image.mode == '1':
+            w, h = image.size
+            packed = np.frombuffer(image.tobytes(), np.uint8).reshape(h, -1)
+            return cls.from_packed(~packed, (h, w))
+        gray = np.asarray(image.convert('L'))
+        if threshold is None:
+            threshold = gray.max()
+        return cls(gray < threshold)
+
+    @classmethod
+    def from_packed(cls, packed, shape):
+        """Inverse of `packed`."""
+        return cls(np.unpackbits(packed, axis=1)[:, :shape[1]].view(bool))
+
+    def packed(self):
+        """Rows of the image packed into bytes, most significant bit first."""
+        return np.packbits(self.array, axis=1)
+
+    def to_pil(self):
+        """PIL image of mode '1' (background white)."""
+        h, w = self.shape
+        return Image.frombytes('1', (w, h), (~self.packed()).tobytes())
+
+    def to_gray(self):
+        """'B' array with 0 for the foreground and 255 for the background."""
+        return np.where(self.array, np.uint8(0), np.uint8(255))
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def count(self):
+        """Number of foreground pixels."""
+        return int(np.count_nonzero(self.array))
+
+    def reduce(self, level):
+        """Rank reduction by 2, see `reduce_rank`."""
+        return BinaryImage(reduce_rank(self.array, level))
+
+    def expand(self, factor, shape=None):
+        """Replicate every pixel `factor` x `factor` times, then crop or pad
+        (with background) to `shape`."""
+        a = self.array.repeat(factor, axis=0).repeat(factor, axis=1)
+        if shape is None:
+            return BinaryImage(a)
+        out = np.zeros(shape, dtype=bool)
+        a = a[:shape[0], :shape[1]]
+        out[:a.shape[0], :a.shape[1]] = a
+        return BinaryImage(out)
+
+    def __getitem__(self, key):
+        return BinaryImage(self.array[key])
+
+    def __invert__(self):
+        return BinaryImage(~self.array)
+
+    def __and__(self, other):
+        return BinaryImage(self.array & _asarray(other))
+
+    def __or__(self, other):
+        return BinaryImage(self.array | _asarray(other))
+
+    def __xor__(self, other):
+        return BinaryImage(self.array ^ _asarray(other))
+
+    def __eq__(self, other):
+        return isinstance(other, BinaryImage) and np.array_equal(self.array, other.array)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return {'shape': self.shape, 'packed': self.packed()}
+
+    def __setstate__(self, state):
+        self.array = BinaryImage.from_packed(state['packed'], state['shape']).array
+
+    def __repr__(self):
+        return "BinaryImage(%dx%d, %d foreground)" % (self.shape[1], self.shape[0], self.count())
+
+
+def _asarray(other):
+    return other.array if isinstance(other, BinaryImage) else other
@@ -0,0 +1,95 @@
+"""
+Clustering of axis-aligned boxes, given as rows of x1, y1, x2, y2.
+
+Used by the cropper to combine text area candidates into the page frame.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+__all__ = ['merge_overlapping', 'merge_columns', 'filter_noisebox']
+
+
+def _as_boxes(boxes):
+    return np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+
+
+def _union(boxes, starts):
+    """Union of each run of `boxes` beginning at the indices `starts`."""
+    return np.column_stack((np.minimum.reduceat(boxes[:, 0], starts),
+                            np.minimum.reduceat(boxes[:, 1], starts),
+                            np.maximum.reduceat(boxes[:, 2], starts),
+                            np.maximum.reduceat(boxes[:, 3], starts)))
+
+
+def merge_overlapping(boxes):
+    """Merge the boxes whose horizontal extents overlap, directly or via
+    other boxes, into their union.
+
+    Sorted by their left edge, the boxes of a cluster are contiguous: a new
+    cluster starts wherever a box begins right of all previous right edges.
+    Returns the merged boxes, sorted by their left edge.
+    """
+    boxes = np.unique(_as_boxes(boxes), axis=0)
+    if len(boxes) == 0:
+        return boxes
+    reach = np.maximum.accumulate(boxes[:, 2])
+    starts = np.flatnonzero(np.r_[True, boxes[1:, 0] > reach[:-1]])
+    return _union(boxes, starts)
+
+
+def merge_columns(boxes, colsep):
+    """Merge all boxes that are at most `colsep` pixels apart from their
+    right neighbour into a single box (appended last), and keep the others.
+    """
+    boxes = _as_boxes(boxes)
+    boxes = boxes[np.argsort(boxes[:, 0], kind='stable')]
+    close = boxes[1:, 0] - boxes[:-1, 2] <= colsep
+    if not close.any():
+        return boxes
+    merged = np.r_[close, False] | np.r_[False, close]
+    return np.vstack((boxes[~merged], _union(boxes[merged], [0])))
+
+
+def filter_noisebox(boxes, height, width, gap=100, maxarea=0.001):
+    """Drop small boxes at the top and bottom of the page.
+
+    Sorted by their bottom edge, the first (last) box is dropped as long as
+    it is more than `gap` pixels apart from the next (previous) one and
+    smaller than `maxarea` of the `height` x `width` page. Boxes equal to a
+    dropped one are dropped as well. Returns the remaining boxes, sorted by
+    their bottom edge.
+    """
+    boxes = sorted([list(b) for b in boxes], key=lambda b: b[3])
+    alive = [True] * len(boxes)
+    count = len(boxes)
+    same = defaultdict(list)
+    for i, b in enumerate(boxes):
+        same[tuple(b)].append(i)
+
+    def small(b):
+        return float(abs(b[2]-b[0])*abs(b[3]-b[1]))/(height*width) < maxarea
+
+    def skip(i, step):
+        while 0 <= i < len(boxes) and not alive[i]:
+            i += step
+        return i
+
+    lo, hi = 0, len(boxes) - 1
+    while count > 1:
+        drop = []
+        first, second = boxes[lo], boxes[skip(lo + 1, 1)]
+        if abs(first[3]-second[1]) > gap and small(first):
+            drop.append(first)
+        last, second = boxes[hi], boxes[skip(hi - 1, -1)]
+        if abs(second[3]-last[1]) > gap and small(last):
+            drop.append(last)
+        if not drop:
+            break
+        for b in drop:
+            for i in same.pop(tuple(b), []):
+                alive[i] = False
+                count -= 1
+        lo, hi = skip(lo, 1), skip(hi, -1)
+    return [b for b, keep in zip(boxes, alive) if keep]
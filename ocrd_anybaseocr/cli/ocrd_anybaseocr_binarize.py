@@ -38,15 +38,17 @@
 #!/usr/bin/env python
 
 
-import ocrolib
 import os
 
-from pylab import amin, amax, mean, ginput, ones, clip, imshow, median, ion, gray, minimum, array, clf
-from scipy.ndimage import filters, interpolation, morphology
-from scipy import stats
+from pylab import amin, amax, mean, ginput, clip, imshow, median, ion, gray, minimum, array, clf
 import numpy as np
+from PIL import Image
 
 from ..constants import OCRD_TOOL
+from ..binary import BinaryImage
+from ..background import estimate_background, background_halo, check_background
+from ..thresholds import IntensityHistogram, local_deviation, estimation_mask, estimate_lo_hi
+from ..utils import imap_ordered, tile_slices, read_image_gray
 
 from ocrd import Processor
 from ocrd_modelfactory import page_from_file
@@ -104,6 +106,33 @@ class OcrdAnybaseocrBinarizer(Processor):
             self.page_grp = self.output_file_grp
             self.image_grp = FALLBACK_IMAGE_GRP
             LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
+
+        # pages are binarized on the worker pool, but only this process
+        # writes to the workspace (images, PAGE files and METS)
+        results = imap_ordered(_binarize_page, self._jobs(), self.parameter['parallel'],
+                               initializer=_init_worker, initargs=(self.parameter,))
+        for (n, input_file, pcgts, file_id, page_id), result in results:
+            page = pcgts.get_Page()
+            if result is not None:
+                binary, lo, hi, comment = result
+                LOG.info("%s lo-hi (%.2f %.2f) %s" % (page_id, lo, hi, comment))
+                self._save_segment(page, binary, page_id, file_id + ".bin")
+
+            # To retain the basenames of files and their respective dir:
+            file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
+            if file_id == input_file.ID:
+                file_id = concat_padded(self.output_file_grp, n)
+            self.workspace.add_file(
+                ID=file_id,
+                file_grp=self.output_file_grp,
+                pageId=input_file.pageId,
+                mimetype=MIMETYPE_PAGE,
+                local_filename=os.path.join(self.output_file_grp,
+                                        file_id + '.xml'),
+                content=to_xml(pcgts).encode('utf-8')
+            )
+
+    def _jobs(self):
         oplevel = self.parameter['operation_level']
 
         for (n, input_file) in enumerate(self.input_files):
@@ -125,8 +154,9 @@ class OcrdAnybaseocrBinarizer(Processor):
             page_image, page_xywh, page_image_info = self.workspace.image_from_page(page, page_id)
             LOG.info("Binarizing on '%s' level in page '%s'", oplevel, page_id)                    
             
+            context = (n, input_file, pcgts, file_id, page_id)
             if oplevel=="page":
-                self._process_segment(page, page_image.filename, page_id, file_id + ".bin")
+                yield context, (page_image.filename, page_id)
             else:
                 regions = page.get_TextRegion() + page.get_TableRegion()
                 if not regions:
@@ -135,40 +165,34 @@ class OcrdAnybaseocrBinarizer(Processor):
                     region_image, region_xywh = self.workspace.image_from_segment(region, page_image, page_xywh)            
                     # strange TODO at the moment
                     #self._process_segment(region.filename, region.id)
-
-            # To retain the basenames of files and their respective dir:
-            file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)            
-            if file_id == input_file.ID:
-                file_id = concat_padded(self.output_file_grp, n)                
-            self.workspace.add_file(
-                ID=file_id,
-                file_grp=self.output_file_grp,
-                pageId=input_file.pageId,
-                mimetype=MIMETYPE_PAGE,
-                local_filename=os.path.join(self.output_file_grp,
-                                        file_id + '.xml'),
-                content=to_xml(pcgts).encode('utf-8')
-            )
-
-
-
-    def _process_segment(self, page, filename, page_id, file_id):
-        raw = ocrolib.read_image_gray(filename)
+                yield context, (None, page_id)
+
+    def _process_segment(self, filename, page_id):
+        """Binarize the image in `filename`.
+
+        Returns the binarized image as `BinaryImage` along with the lo/hi thresholds and a comment, or None if the
+        page was skipped.
+        """
+        if filename is None:
+            return None
+        if self.parameter['tilesize'] > 0:
+            return self._process_segment_tiled(filename, page_id)
+        raw = read_image_gray(filename, self.parameter['precision'])
         self.dshow(raw, "input")
 
         # perform image normalization
         image = raw-amin(raw)
         if amax(image) == amin(image):
             LOG.info("# image is empty: %s" % (page_id))
-            return
+            return None
         image /= amax(image)
 
         if not self.parameter['nocheck']:
             check = self.check_page(amax(image)-image)
             if check is not None:
-                LOG.error(input_file.pageId or input_file.ID+" SKIPPED. "+check +
+                LOG.error(page_id+" SKIPPED. "+check +
                             " (use -n to disable this check)")
-                return
+                return None
 
         # check whether the image is already effectively binarized
         if self.parameter['gray']:
@@ -183,12 +207,10 @@ class OcrdAnybaseocrBinarizer(Processor):
             comment = ""
             # if not, we need to flatten it by estimating the local whitelevel
             LOG.info("Flattening")
-            m = interpolation.zoom(image, self.parameter['zoom'])
-            m = filters.percentile_filter(
-                m, self.parameter['perc'], size=(self.parameter['range'], 2))
-            m = filters.percentile_filter(
-                m, self.parameter['perc'], size=(2, self.parameter['range']))
-            m = interpolation.zoom(m, 1.0/self.parameter['zoom'])
+            perc, range_, zoom = self.parameter['perc'], self.parameter['range'], self.parameter['zoom']
+            m = estimate_background(image, perc, range_, zoom, self.parameter['bgmethod'])
+            if self.parameter['bgmethod'] != 'percentile' and self.parameter['bgtolerance'] > 0:
+                m = check_background(image, m, perc, range_, zoom, self.parameter['bgtolerance'])
             if self.parameter['debug'] > 0:
                 clf()
                 imshow(m, vmin=0, vmax=1)
@@ -206,24 +228,19 @@ class OcrdAnybaseocrBinarizer(Processor):
         o0, o1 = int(self.parameter['bignore']
                      * d0), int(self.parameter['bignore']*d1)
         est = flat[o0:d0-o0, o1:d1-o1]
+        v = None
         if self.parameter['escale'] > 0:
             # by default, we use only regions that contain
             # significant variance; this makes the percentile
             # based low and high estimates more reliable
-            e = self.parameter['escale']
-            v = est-filters.gaussian_filter(est, e*20.0)
-            v = filters.gaussian_filter(v**2, e*20.0)**0.5
-            v = (v > 0.3*amax(v))
-            v = morphology.binary_dilation(
-                v, structure=ones((int(e*50), 1)))
-            v = morphology.binary_dilation(
-                v, structure=ones((1, int(e*50))))
+            v = estimation_mask(est, self.parameter['escale'])
             if self.parameter['debug'] > 0:
                 imshow(v)
                 ginput(1, self.parameter['debug'])
-            est = est[v]
-        lo = stats.scoreatpercentile(est.ravel(), self.parameter['lo'])
-        hi = stats.scoreatpercentile(est.ravel(), self.parameter['hi'])
+        lo, hi = estimate_lo_hi(est, self.parameter['lo'], self.parameter['hi'], v)
+        if hi <= lo:
+            # nothing to normalize (e.g. a blank page)
+            lo, hi = 0.0, 1.0
         # rescale the image to get the gray scale image
         LOG.info("Rescaling")
         flat -= lo
@@ -232,12 +249,10 @@ class OcrdAnybaseocrBinarizer(Processor):
         if self.parameter['debug'] > 0:
             imshow(flat, vmin=0, vmax=1)
             ginput(1, self.parameter['debug'])
-        binarized = 1*(flat > self.parameter['threshold'])
+        binarized = (flat > self.parameter['threshold'])
 
         # output the normalized grayscale and the thresholded images
         # print_info("%s lo-hi (%.2f %.2f) angle %4.1f %s" % (fname, lo, hi, angle, comment))
-        LOG.info("%s lo-hi (%.2f %.2f) %s" % (page_id, lo, hi, comment))
-        LOG.info("writing")
         if self.parameter['debug'] > 0 or self.parameter['show']:
             clf()
             gray()
@@ -250,13 +265,115 @@ class OcrdAnybaseocrBinarizer(Processor):
         # write_to_xml(base+".bin.png")
         # return base+".bin.png"
 
-        bin_array = array(255*(binarized>ocrolib.midrange(binarized)),'B')
-        bin_image = ocrolib.array2pil(bin_array)                            
-        
-        file_path = self.workspace.save_image_file(bin_image,
+        return BinaryImage(~binarized), lo, hi, comment
+
+    def _process_segment_tiled(self, filename, page_id):
+        """Binarize the image in `filename` tile by tile.
+
+        Same as `_process_segment`, but the page is only held as 8 bit and
+        the flattened page as 16 bit array, while all floating point work is
+        done on overlapping tiles of `tilesize` pixels. The halos cover the
+        support of the filters, so the tiles are seamless, and the lo/hi
+        percentiles are taken from a histogram accumulated over the tiles.
+        """
+        raw = np.asarray(Image.open(filename).convert('L'))
+        lo8, hi8 = int(amin(raw)), int(amax(raw))
+        if lo8 == hi8:
+            LOG.info("# image is empty: %s" % (page_id))
+            return None
+
+        if not self.parameter['nocheck']:
+            check = self.check_page(hi8-raw)
+            if check is not None:
+                LOG.error(page_id+" SKIPPED. "+check +
+                            " (use -n to disable this check)")
+                return None
+
+        dtype = np.dtype(self.parameter['precision'])
+
+        def normalized(tile):
+            return np.subtract(tile, lo8, dtype=dtype)/dtype.type(hi8-lo8)
+
+        def unpacked(tile):
+            return np.divide(tile, 65535, dtype=dtype)
+
+        # check whether the image is already effectively binarized
+        if self.parameter['gray']:
+            extreme = 0
+        else:
+            levels = normalized(np.arange(256))
+            counts = np.bincount(raw.ravel(), minlength=256)
+            extreme = (np.sum(counts[levels < 0.05]) + np.sum(counts[levels > 0.95])
+                       ) * 1.0 / np.prod(raw.shape)
+
+        size = self.parameter['tilesize']
+        flat = np.empty(raw.shape, np.uint16)
+        if extreme > 0.95:
+            comment = "no-normalization"
+            for outer, _ in tile_slices(raw.shape, size):
+                flat[outer] = np.rint(normalized(raw[outer])*65535)
+        else:
+            comment = ""
+            LOG.info("Flattening")
+            perc, range_, zoom = self.parameter['perc'], self.parameter['range'], self.parameter['zoom']
+            for outer, inner in tile_slices(raw.shape, size, background_halo(range_, zoom)):
+                image = normalized(raw[outer])
+                origin = (outer[0].start, outer[1].start)
+                m = estimate_background(image, perc, range_, zoom, self.parameter['bgmethod'],
+                                        origin, raw.shape)
+                if self.parameter['bgmethod'] != 'percentile' and self.parameter['bgtolerance'] > 0:
+                    m = check_background(image, m, perc, range_, zoom, self.parameter['bgtolerance'],
+                                         origin, raw.shape)
+                flat[outer][inner] = np.rint(clip(image-m+1, 0, 1)[inner]*65535)
+
+        # estimate low and high thresholds
+        LOG.info("Estimating Thresholds")
+        d0, d1 = flat.shape
+        o0, o1 = int(self.parameter['bignore']
+                     * d0), int(self.parameter['bignore']*d1)
+        region = (slice(o0, d0-o0), slice(o1, d1-o1))
+        hist = IntensityHistogram(0.0, 1.0, 65536)
+        if self.parameter['escale'] > 0:
+            e = self.parameter['escale']
+            # support of both gaussians and of the dilations
+            halo = 2*int(4*e*20.0+0.5) + int(e*50)
+            vmax = max(amax(local_deviation(unpacked(flat[outer]), e)[inner])
+                       for outer, inner in tile_slices(flat.shape, size, halo, region))
+            for outer, inner in tile_slices(flat.shape, size, halo, region):
+                est = flat[outer]
+                v = estimation_mask(unpacked(est), e, vmax)
+                hist.add_codes(est[inner][v[inner]])
+        if hist.total == 0:
+            # no significant variance anywhere (e.g. a blank page), use all pixels
+            for outer, _ in tile_slices(flat.shape, size, region=region):
+                hist.add_codes(flat[outer])
+        lo = hist.percentile(self.parameter['lo'])
+        hi = hist.percentile(self.parameter['hi'])
+        if hi <= lo:
+            # nothing to normalize (e.g. a blank page)
+            lo, hi = 0.0, 1.0
+
+        # rescale and threshold
+        LOG.info("Rescaling")
+        foreground = np.empty(flat.shape, bool)
+        for outer, _ in tile_slices(flat.shape, size):
+            tile = clip((unpacked(flat[outer])-lo)/(hi-lo), 0, 1)
+            foreground[outer] = tile <= self.parameter['threshold']
+        return BinaryImage(foreground), lo, hi, comment
+
+    def _save_segment(self, page, binary, page_id, file_id):
+        file_path = self.workspace.save_image_file(binary.to_pil(),
                                    file_id,
                                    page_id=page_id,
                                    file_grp=self.image_grp
             )     
         page.add_AlternativeImage(AlternativeImageType(filename=file_path, comment="binarized"))        
-            
+
+
+def _init_worker(parameter):
+    global _WORKER
+    _WORKER = OcrdAnybaseocrBinarizer(None, parameter=parameter)
+
+
+def _binarize_page(filename, page_id):
+    return _WORKER._process_segment(filename, page_id)
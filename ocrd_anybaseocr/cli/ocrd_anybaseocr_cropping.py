@@ -31,6 +31,7 @@
 
 
 import os
+import heapq
 import numpy as np
 from pylsd.lsd import lsd
 import ocrolib
@@ -39,6 +40,8 @@ from PIL import Image
 
 
 from ..constants import OCRD_TOOL
+from ..boxes import merge_overlapping, merge_columns, filter_noisebox
+from ..utils import imap_ordered
 
 from ocrd import Processor
 from ocrd_utils import getLogger, concat_padded, MIMETYPE_PAGE
@@ -55,13 +58,103 @@ TOOL = 'ocrd-anybaseocr-crop'
 LOG = getLogger('OcrdAnybaseocrCropper')
 FALLBACK_IMAGE_GRP = 'OCR-D-IMG-CROP'
 
+def _gray(arg, code=cv2.COLOR_RGB2GRAY):
+    return arg if arg.ndim == 2 else cv2.cvtColor(arg, code)
+
+
+def _color(arg, rgb):
+    """`rgb` for drawing into `arg`, or its gray value if `arg` is grayscale."""
+    if arg.ndim == 2:
+        return int(round(0.299*rgb[0] + 0.587*rgb[1] + 0.114*rgb[2]))
+    return rgb
+
+
+def _to_full(p, scale):
+    """Full resolution position of position `p` on a proxy downscaled by
+    `scale`, in pixel centers (pixel i is at i, its left edge at i-0.5)."""
+    return (p + 0.5) / scale - 0.5
+
+
+def _to_proxy(p, scale):
+    """Inverse of `_to_full`."""
+    return (p + 0.5) * scale - 0.5
+
+
+def _proxy_scales(img_array, small):
+    """Horizontal and vertical scale of the proxy `small` of `img_array`."""
+    height, width = img_array.shape[:2]
+    return small.shape[1] / float(width), small.shape[0] / float(height)
+
+
+def _edge_position(gray, axis, pos, extent, band):
+    """Position (in pixel centers) of the intensity edge across `axis`
+    within `band` pixels of the pixel boundary `pos`, over the `extent`
+    along the other axis, or None if there is none.
+
+    The edge is the centroid of the gradient of the mean intensity across
+    the band, which downscaling by area averaging preserves.
+    """
+    lo, hi = max(0, pos-band), min(gray.shape[1-axis], pos+band)
+    if axis == 0:
+        strip = gray[extent[0]:extent[1], lo:hi]
+    else:
+        strip = gray[lo:hi, extent[0]:extent[1]]
+    if strip.size == 0:
+        return None
+    # the gradient between pixels i and i+1 is at i+0.5
+    gradient = np.abs(np.diff(np.mean(strip, axis=axis)))
+    if not gradient.any():
+        return None
+    return lo + 0.5 + np.dot(gradient, np.arange(len(gradient))) / np.sum(gradient)
+
+
+def contained_rects(rects):
+    """Mask of the rectangles (rows of x, y, w, h) that lie strictly inside
+    another one of `rects`.
+
+    Sweeps over the rectangles from left to right, keeping those that
+    overlap the sweep position in a heap by their right edge, so that each
+    rectangle is only compared against the ones it overlaps horizontally.
+    """
+    x0, y0 = rects[:, 0], rects[:, 1]
+    x1, y1 = x0 + rects[:, 2], y0 + rects[:, 3]
+    order = np.argsort(x0, kind='stable')
+    contained = np.zeros(len(rects), dtype=bool)
+    active = []
+    started = 0
+    for i in order:
+        # containers must start strictly left of rectangle i
+        while started < len(order) and x0[order[started]] < x0[i]:
+            j = order[started]
+            heapq.heappush(active, (x1[j], j))
+            started += 1
+        # those ending left of rectangle i cannot contain it or any later one
+        while active and active[0][0] <= x0[i]:
+            heapq.heappop(active)
+        if active:
+            cand = np.array([j for _, j in active])
+            contained[i] = np.any((y0[cand] < y0[i]) & (x1[cand] > x1[i]) & (y1[cand] > y1[i]))
+    return contained
+
+
 class OcrdAnybaseocrCropper(Processor):
 
+    # resolution of the image under analysis relative to the full scan,
+    # the pixel sizes below are meant for the latter
+    scale = 1.0
+    # ruler of the previous page (relative x, y, w, h and black pixel
+    # density), with rularCache
+    rular = None
+
     def __init__(self, *args, **kwargs):
         kwargs['ocrd_tool'] = OCRD_TOOL['tools'][TOOL]
         kwargs['version'] = OCRD_TOOL['version']
         super(OcrdAnybaseocrCropper, self).__init__(*args, **kwargs)
 
+    def _px(self, n):
+        """`n` full resolution pixels at the current scale."""
+        return max(1, int(round(n*self.scale)))
+
     def write_crop_coordinate(self, base, coordinate):
         x1, y1, x2, y2 = coordinate
         with open(base + '-frame-pf.dat', 'w') as fp:
@@ -70,34 +163,28 @@ class OcrdAnybaseocrCropper(Processor):
     def rotate_image(self, orientation, image):  
         return image.rotate(orientation)
 
-    def remove_rular(self, arg):
+    def find_rular(self, arg):
+        """Return the ruler rectangle (x, y, w, h) in `arg`, or None."""
         #base = arg.split(".")[0]
         #img = cv2.cvtColor(arg, cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(arg, cv2.COLOR_BGR2GRAY)            
+        gray = _gray(arg, cv2.COLOR_BGR2GRAY)
         contours, _ = cv2.findContours(
             gray, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
         
-        height, width, _ = arg.shape
+        height, width = arg.shape[:2]
         imgArea = height*width
 
         # Get bounding box x,y,w,h of each contours
-        rects = [cv2.boundingRect(cnt) for cnt in contours]
-        rects = sorted(rects, key=lambda x: (x[2]*x[3]), reverse=True)
+        rects = np.array([cv2.boundingRect(cnt) for cnt in contours], dtype=np.int64).reshape(-1, 4)
+        area = rects[:, 2]*rects[:, 3]
+        rects = rects[np.argsort(-area, kind='stable')]
+        area = rects[:, 2]*rects[:, 3]
         # consider those rectangle whose area>10000 and less than one-fourth of images
-        rects = [r for r in rects if (
-            imgArea*self.parameter['maxRularArea']) > (r[2]*r[3]) > (imgArea*self.parameter['minRularArea'])]
-
-        # detect child rectangles. Usually those are not ruler. Rular position are basically any one side.
-        removeRect = []
-        for i, rect1 in enumerate(rects):
-            (x1, y1, w1, h1) = rect1
-            for rect2 in rects[i+1:len(rects)]:
-                (x2, y2, w2, h2) = rect2
-                if (x1 < x2) and (y1 < y2) and (x1+w1 > x2+w2) and (y1+h1 > y2+h2):
-                    removeRect.append(rect2)
+        rects = rects[((imgArea*self.parameter['maxRularArea']) > area) &
+                      (area > (imgArea*self.parameter['minRularArea']))]
 
-        # removed child rectangles.
-        rects = [x for x in rects if x not in removeRect]
+        # detect and remove child rectangles. Usually those are not ruler. Rular position are basically any one side.
+        rects = [tuple(r) for r in rects[~contained_rects(rects)].tolist()]
 
         predictRular = []
         for rect in rects:
@@ -111,10 +198,47 @@ class OcrdAnybaseocrCropper(Processor):
         if predictRular:
             predictRular = sorted(
                 predictRular, key=lambda x: (x[4]), reverse=True)
-            x, y, w, h, _ = predictRular[0]
-            cv2.rectangle(arg, (x-15, y-15), (x+w+20, y+h+20),
-                          (255, 255, 255), cv2.FILLED)
-        
+            return predictRular[0][:4]
+        return None
+
+    def check_rular(self, arg):
+        """Return the cached ruler rectangle (x, y, w, h) if the density of
+        black pixels in it is still the same in `arg`, otherwise None."""
+        height, width = arg.shape[:2]
+        fx, fy, fw, fh, density = self.rular
+        x, y = int(round(fx*width)), int(round(fy*height))
+        w, h = int(round(fw*width)), int(round(fh*height))
+        if w < 1 or h < 1:
+            return None
+        if abs(np.mean(arg[y:y+h, x:x+w] == 0) - density) > self.parameter['rularCacheTolerance']:
+            return None
+        return x, y, w, h
+
+    def remove_rular(self, arg):
+        """Fill the ruler in `arg` with white.
+
+        With `rularCache`, the ruler found on the previous page is reused
+        if it passes `check_rular`, and only otherwise searched anew.
+        """
+        rular = None
+        if self.parameter['rularCache'] and self.rular is not None:
+            rular = self.check_rular(arg)
+            if rular is None:
+                LOG.debug("cached ruler not found, searching")
+        if rular is None:
+            rular = self.find_rular(arg)
+            if self.parameter['rularCache']:
+                self.rular = None
+                if rular is not None:
+                    height, width = arg.shape[:2]
+                    x, y, w, h = rular
+                    self.rular = (float(x)/width, float(y)/height, float(w)/width, float(h)/height,
+                                  np.mean(arg[y:y+h, x:x+w] == 0))
+        if rular is not None:
+            x, y, w, h = rular
+            cv2.rectangle(arg, (x-self._px(15), y-self._px(15)), (x+w+self._px(20), y+h+self._px(20)),
+                          _color(arg, (255, 255, 255)), cv2.FILLED)
+
         return arg
 
     def BorderLine(self, MaxBoundary, lines, index, flag, lineDetectH, lineDetectV):
@@ -122,7 +246,7 @@ class OcrdAnybaseocrCropper(Processor):
         LastLine = []
         if flag in ('top', 'left'):
             for i in range(len(lines)-1):
-                if(abs(lines[i][index]-lines[i+1][index])) <= 15 and lines[i][index] < MaxBoundary:
+                if(abs(lines[i][index]-lines[i+1][index])) <= self._px(15) and lines[i][index] < MaxBoundary:
                     LastLine = [lines[i][0], lines[i]
                                 [1], lines[i][2], lines[i][3]]
                     getLine += 1
@@ -132,7 +256,7 @@ class OcrdAnybaseocrCropper(Processor):
                     getLine = 1
         elif flag in ('bottom', 'right'):
             for i in reversed(list(range(len(lines)-1))):
-                if(abs(lines[i][index]-lines[i+1][index])) <= 15 and lines[i][index] > MaxBoundary:
+                if(abs(lines[i][index]-lines[i+1][index])) <= self._px(15) and lines[i][index] > MaxBoundary:
                     LastLine = [lines[i][0], lines[i]
                                 [1], lines[i][2], lines[i][3]]
                     getLine += 1
@@ -176,18 +300,18 @@ class OcrdAnybaseocrCropper(Processor):
     def detect_lines(self, arg):
         Hline = []
         Vline = []
-        gray = cv2.cvtColor(arg, cv2.COLOR_RGB2GRAY)
-        imgHeight, imgWidth, _ = arg.shape
+        gray = _gray(arg)
+        imgHeight, imgWidth = arg.shape[:2]
         lines = lsd(gray)
 
         for i in range(lines.shape[0]):
             pt1 = (int(lines[i, 0]), int(lines[i, 1]))
             pt2 = (int(lines[i, 2]), int(lines[i, 3]))
             # consider those line whise length more than this orbitrary value
-            if (abs(pt1[0]-pt2[0]) > 45) and ((int(pt1[1]) < imgHeight*0.25) or (int(pt1[1]) > imgHeight*0.75)):
+            if (abs(pt1[0]-pt2[0]) > self._px(45)) and ((int(pt1[1]) < imgHeight*0.25) or (int(pt1[1]) > imgHeight*0.75)):
                 # make full horizontal line
                 Hline.append([0, int(pt1[1]), imgWidth, int(pt2[1])])
-            if (abs(pt1[1]-pt2[1]) > 45) and ((int(pt1[0]) < imgWidth*0.4) or (int(pt1[0]) > imgWidth*0.6)):
+            if (abs(pt1[1]-pt2[1]) > self._px(45)) and ((int(pt1[0]) < imgWidth*0.4) or (int(pt1[0]) > imgWidth*0.6)):
                 # make full vertical line
                 Vline.append([int(pt1[0]), 0, int(pt2[0]), imgHeight])
         Hline.sort(key=lambda x: (x[1]), reverse=False)
@@ -225,62 +349,34 @@ class OcrdAnybaseocrCropper(Processor):
         Ystart = 0
         Yend = imgHeight
         for i in intersectPoint:
-            Xs = int(i[0])+10 if i[0] < imgWidth*0.4 else 10
+            Xs = int(i[0])+self._px(10) if i[0] < imgWidth*0.4 else self._px(10)
             if Xs > Xstart:
                 Xstart = Xs
-            Xe = int(i[0])-10 if i[0] > imgWidth*0.6 else int(imgWidth)-10
+            Xe = int(i[0])-self._px(10) if i[0] > imgWidth*0.6 else int(imgWidth)-self._px(10)
             if Xe < Xend:
                 Xend = Xe
-            Ys = int(i[1])+10 if i[1] < imgHeight*0.25 else 10
+            Ys = int(i[1])+self._px(10) if i[1] < imgHeight*0.25 else self._px(10)
             # print("Ys,Ystart:",Ys,Ystart)
             if Ys > Ystart:
                 Ystart = Ys
-            Ye = int(i[1])-15 if i[1] > imgHeight*0.75 else int(imgHeight)-15
+            Ye = int(i[1])-self._px(15) if i[1] > imgHeight*0.75 else int(imgHeight)-self._px(15)
             if Ye < Yend:
                 Yend = Ye
 
         if Xend < 0:
-            Xend = 10
+            Xend = self._px(10)
         if Yend < 0:
-            Yend = 15
+            Yend = self._px(15)
         #self.save_pf(base, [Xstart, Ystart, Xend, Yend])
 
         return [Xstart, Ystart, Xend, Yend]
 
     def filter_noisebox(self, textarea, height, width):
-        tmp = []
-        st = True
-
-        while st:
-            textarea = [list(x) for x in textarea if x not in tmp]
-            if len(textarea) > 1:
-                tmp = []
-                textarea = sorted(
-                    textarea, key=lambda x: (x[3]), reverse=False)
-                # print textarea
-                x11, y11, x12, y12 = textarea[0]
-                x21, y21, x22, y22 = textarea[1]
-
-                if abs(y12-y21) > 100 and (float(abs(x12-x11)*abs(y12-y11))/(height*width)) < 0.001:
-                    tmp.append(textarea[0])
-
-                x11, y11, x12, y12 = textarea[-2]
-                x21, y21, x22, y22 = textarea[-1]
-
-                if abs(y12-y21) > 100 and (float(abs(x21-x22)*abs(y22-y21))/(height*width)) < 0.001:
-                    tmp.append(textarea[-1])
-
-                if len(tmp) == 0:
-                    st = False
-            else:
-                break
-
-        return textarea
+        return filter_noisebox(textarea, height, width, gap=self._px(100))
 
     def detect_textarea(self, arg):
-        textarea = []
-        small = cv2.cvtColor(arg, cv2.COLOR_RGB2GRAY)
-        height, width, _ = arg.shape
+        small = _gray(arg)
+        height, width = arg.shape[:2]
 
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
         grad = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, kernel)
@@ -289,23 +385,28 @@ class OcrdAnybaseocrCropper(Processor):
             grad, 0.0, 255.0, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
 
         kernel = cv2.getStructuringElement(
-            cv2.MORPH_RECT, (10, 1))  # for historical docs
+            cv2.MORPH_RECT, (self._px(10), 1))  # for historical docs
         connected = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, kernel)
-        contours, _ = cv2.findContours(
-            connected.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-
-        mask = np.zeros(bw.shape, dtype=np.uint8)
 
-        for idx in range(len(contours)):
-            x, y, w, h = cv2.boundingRect(contours[idx])
-            # print x,y,w,h
-            mask[y:y+h, x:x+w] = 0
-            cv2.drawContours(mask, contours, idx, (255, 255, 255), -1)
-            r = float(cv2.countNonZero(mask[y:y+h, x:x+w])) / (w * h)
-
-            if r > 0.45 and (width*0.9) > w > 15 and (height*0.5) > h > 15:
-                textarea.append([x, y, x+w-1, y+h-1])
-                cv2.rectangle(arg, (x, y), (x+w-1, y+h-1), (0, 0, 255), 2)
+        # the areas enclosed by the outer contours: components with their
+        # holes, i.e. everything the background outside cannot reach
+        outside = np.zeros((height+4, width+4), np.uint8)
+        cv2.floodFill(np.pad(connected, 1, 'constant'), outside, (0, 0), 255,
+                      flags=4 | cv2.FLOODFILL_MASK_ONLY | (1 << 8))
+        filled = 1 - outside[2:-2, 2:-2]
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(filled, connectivity=8)
+        x, y, w, h, area = (stats[1:, i] for i in range(5))
+        r = area / (w * h).astype(float)
+
+        keep = np.flatnonzero((r > 0.45) & ((width*0.9) > w) & (w > self._px(15)) &
+                              ((height*0.5) > h) & (h > self._px(15)))
+        # in the order of cv2.findContours, i.e. by descending start point
+        # (first pixel in raster order)
+        start = [x[i] + np.argmax(labels[y[i], x[i]:x[i]+w[i]] == i+1) for i in keep]
+        keep = keep[np.lexsort((start, y[keep]))[::-1]]
+        textarea = np.column_stack((x, y, x+w-1, y+h-1))[keep].tolist()
+        for x1, y1, x2, y2 in textarea:
+            cv2.rectangle(arg, (x1, y1), (x2, y2), _color(arg, (0, 0, 255)), 2)
 
         if len(textarea) > 1:
             textarea = self.filter_noisebox(textarea, height, width)
@@ -320,81 +421,29 @@ class OcrdAnybaseocrCropper(Processor):
         img2.save(base + '.pf.png')
         self.write_crop_coordinate(base, textarea)
 
-    def filter_area(self, textarea, binImg):
-        height, width, _ = binImg.shape
-        tmp = []
-        for area in textarea:
-            if (height*width*self.parameter['minArea'] < (abs(area[2]-area[0]) * abs(area[3]-area[1]))):
-                tmp.append(area)
-        return tmp
-
-    def marge_columns(self, textarea):
-        tmp = []
-        marge = []
-        #  height, _ = binImg.shape        
-        textarea.sort(key=lambda x: (x[0]))
-        # print self.parameter['colSeparator']
-        for i in range(len(textarea)-1):
-            st = False
-            x11, y11, x12, y12 = textarea[i]
-            x21, y21, x22, y22 = textarea[i+1]
-            if x21-x12 <= self.parameter['colSeparator']:
-                if len(marge) > 0:
-                    # print "marge ", marge[0]
-                    x31, y31, x32, y32 = marge[0]
-                    marge.pop(0)
-                else:
-                    x31, y31, x32, y32 = [9999, 9999, 0, 0]
-                marge.append([min(x11, x21, x31), min(y11, y21, y31),
-                              max(x12, x22, x32), max(y12, y22, y32)])
-                st = True
-            else:
-                tmp.append(textarea[i])
+    def filter_area(self, textarea, shape):
+        height, width = shape[:2]
+        textarea = np.asarray(textarea).reshape(-1, 4)
+        area = np.abs(textarea[:, 2]-textarea[:, 0]) * np.abs(textarea[:, 3]-textarea[:, 1])
+        return textarea[height*width*self.parameter['minArea'] < area]
 
-        if not st:
-            tmp.append(textarea[-1])
+    def marge_columns(self, textarea, colsep):
+        return merge_columns(textarea, colsep)
 
-        return tmp+marge
+    def crop_area(self, textarea, shape, rgb, colsep):
+        height, width = shape[:2]
 
-    def crop_area(self, textarea, binImg, rgb):
-        height, width, _ = binImg.shape
+        areas = merge_overlapping(textarea)
+        for x1, y1, x2, y2 in areas.tolist():
+            cv2.rectangle(rgb, (x1, y1), (x2, y2), _color(rgb, (255, 0, 0)), 2)
 
-        textarea = np.unique(textarea, axis=0)
-        i = 0
-        tmp = []
-        areas = []
-        while i < len(textarea):
-            textarea = [list(x) for x in textarea if x not in tmp]
-            tmp = []
-            if len(textarea) == 0:
-                break
-            maxBox = textarea[0]
-            for chkBox in textarea:
-                if maxBox != chkBox:
-                    x11, y11, x12, y12 = maxBox
-                    x21, y21, x22, y22 = chkBox
-                    if ((x11 <= x21 <= x12) or (x21 <= x11 <= x22)):
-                        tmp.append(maxBox)
-                        tmp.append(chkBox)
-                        maxBox = [min(x11, x21), min(y11, y21),
-                                  max(x12, x22), max(y12, y22)]
-            if len(tmp) == 0:
-                tmp.append(maxBox)
-            x1, y1, x2, y2 = maxBox
-            areas.append(maxBox)
-            cv2.rectangle(rgb, (x1, y1), (x2, y2), (255, 0, 0), 2)
-            i = i+1
-
-        textarea = np.unique(areas, axis=0).tolist()
-        if len(textarea) > 0:
-            textarea = self.filter_area(textarea, binImg)
+        textarea = self.filter_area(areas, shape)
         if len(textarea) > 1:
-            textarea = self.marge_columns(textarea)
-            # print textarea
+            textarea = self.marge_columns(textarea, colsep)
 
         if len(textarea) > 0:
-            textarea = sorted(textarea, key=lambda x: (
-                (x[2]-x[0])*(x[3]-x[1])), reverse=True)
+            area = (textarea[:, 2]-textarea[:, 0])*(textarea[:, 3]-textarea[:, 1])
+            textarea = textarea[np.argsort(-area, kind='stable')]
             # print textarea
             x1, y1, x2, y2 = textarea[0]
             x1 = x1-20 if x1 > 20 else 0
@@ -404,7 +453,93 @@ class OcrdAnybaseocrCropper(Processor):
 
             #self.save_pf(base, [x1, y1, x2, y2])
 
-        return textarea
+        return textarea.tolist()
+
+    def detect_border(self, img_array):
+        """Return the page frame [min_x, min_y, max_x, max_y] of `img_array`
+        (RGB or grayscale).
+
+        With `proxyLongEdge`, the frame is detected on a copy downscaled to
+        that size (with all pixel sizes scaled along) and mapped back.
+        With `proxyRefine`, each edge is then corrected at full resolution
+        within that many pixels, see `refine_border`.
+        """
+        height, width = img_array.shape[:2]
+        proxy = self.parameter['proxyLongEdge']
+        if not 0 < proxy < max(height, width):
+            return self._detect_border(img_array)
+        self.scale = float(proxy) / max(height, width)
+        small = cv2.resize(img_array, (max(1, int(round(width*self.scale))), max(1, int(round(height*self.scale)))),
+                           interpolation=cv2.INTER_AREA)
+        try:
+            # _detect_border draws into its input
+            border = self._detect_border(small.copy())
+        finally:
+            self.scale = 1.0
+        # the frame corners are pixel boundaries (the whole page is
+        # [0, 0, width, height]), i.e. corner c is at pixel position c-0.5
+        scales = _proxy_scales(img_array, small)
+        border = [int(round(_to_full(c - 0.5, s) + 0.5)) for c, s in zip(border, scales * 2)]
+        if self.parameter['proxyRefine'] > 0:
+            border = self.refine_border(img_array, small, border, self.parameter['proxyRefine'])
+        min_x, min_y, max_x, max_y = border
+        return [min(max(min_x, 0), width), min(max(min_y, 0), height),
+                min(max(max_x, 0), width), min(max(max_y, 0), height)]
+
+    def _detect_border(self, img_array):
+        lineDetectH = []
+        lineDetectV = []
+        img_array_rr = self.remove_rular(img_array)
+
+        textarea, img_array_rr_ta, height, width = self.detect_textarea(
+            img_array_rr)
+        colsep = int(width * self.parameter['colSeparator'])
+
+        if len(textarea) > 1:
+            textarea = self.crop_area(
+                textarea, img_array.shape, img_array_rr_ta, colsep)
+
+            if len(textarea) == 0:
+                min_x, min_y, max_x, max_y = self.select_borderLine(
+                    img_array_rr, lineDetectH, lineDetectV)
+            else:
+                min_x, min_y, max_x, max_y = textarea[0]
+        elif len(textarea) == 1 and (height*width*0.5 < (abs(textarea[0][2]-textarea[0][0]) * abs(textarea[0][3]-textarea[0][1]))):
+            min_x, min_y, max_x, max_y = textarea[0]
+        else:
+            min_x, min_y, max_x, max_y = self.select_borderLine(
+                img_array_rr, lineDetectH, lineDetectV)
+        return [min_x, min_y, max_x, max_y]
+
+    def refine_border(self, img_array, small, border, band):
+        """Correct the quantization error of `border` (detected on the
+        downscaled `small`) in each edge: if there is an intensity edge
+        within one proxy pixel of the edge on `small`, the edge is moved
+        onto the intensity edge located within `band` pixels on `img_array`
+        (by at most one proxy pixel).
+        """
+        gray, small_gray = _gray(img_array), _gray(small)
+        sx, sy = _proxy_scales(img_array, small)
+        min_x, min_y, max_x, max_y = border
+
+        def refine(pos, axis, extent):
+            s, t = (sx, sy) if axis == 0 else (sy, sx)
+            # the pixel boundary pos is at pixel position pos-0.5
+            edge = pos - 0.5
+            proxy = _edge_position(small_gray, axis, int(round(_to_proxy(edge, s) + 0.5)),
+                                   [int(round(_to_proxy(e - 0.5, t) + 0.5)) for e in extent],
+                                   max(1, int(round(band*s))))
+            if proxy is None or abs(_to_full(proxy, s) - edge) > 1/s:
+                return pos
+            full = _edge_position(gray, axis, pos, extent, band)
+            if full is None:
+                return pos
+            # at most the size of a proxy pixel
+            shift = np.clip(full - edge, -1/s, 1/s)
+            return int(round(pos + shift))
+
+        return [refine(min_x, 0, (min_y, max_y)), refine(min_y, 1, (min_x, max_x)),
+                refine(max_x, 0, (min_y, max_y)), refine(max_y, 1, (min_x, max_x))]
 
     def process(self):
         try:
@@ -413,73 +548,14 @@ class OcrdAnybaseocrCropper(Processor):
             self.page_grp = self.output_file_grp
             self.image_grp = FALLBACK_IMAGE_GRP
             LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
-        oplevel = self.parameter['operation_level']
 
-        for (n, input_file) in enumerate(self.input_files):
-            file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
-            page_id = input_file.pageId or input_file.ID
-            LOG.info("INPUT FILE %i / %s", n, page_id)
-            pcgts = page_from_file(self.workspace.download_file(input_file))
-            metadata = pcgts.get_Metadata()
-            metadata.add_MetadataItem(
-                    MetadataItemType(type_="processingStep",
-                                     name=self.ocrd_tool['steps'][0],
-                                     value=TOOL,                                     
-                                     Labels=[LabelsType(#externalRef="parameters",
-                                                        Label=[LabelType(type_=name,
-                                                                         value=self.parameter[name])
-                                                               for name in self.parameter.keys()])]))
-            page = pcgts.get_Page()
-            print(page.imageFilename)
-            #page_image, page_xywh, page_image_info = self.workspace.image_from_page(page, page_id)
-                        
-            '''            
-            # Get image orientation
-            orientation = page.get_orientation()
-            rotated_image = self.rotate_image(orientation, page_image)
-            
-            LOG.info("INPUT FILE %s ", input_file.pageId or input_file.ID)
-
-            img_array = ocrolib.pil2array(rotated_image)
-
-            #Check if image is RGB or not
-            if len(img_array.shape)==2:
-                img_array = np.stack((img_array,)*3, axis=-1)
-
-            img_array_bin = np.array(
-                img_array > ocrolib.midrange(img_array), 'i')
-
-            lineDetectH = []
-            lineDetectV = []
-            img_array_rr = self.remove_rular(img_array)        
-
-            textarea, img_array_rr_ta, height, width = self.detect_textarea(
-                img_array_rr)
-            self.parameter['colSeparator'] = int(
-                width * self.parameter['colSeparator'])
-
-            if len(textarea) > 1:
-                textarea = self.crop_area(
-                    textarea, img_array_bin, img_array_rr_ta)
-
-                if len(textarea) == 0:
-                    min_x, min_y, max_x, max_y = self.select_borderLine(
-                        img_array_rr, lineDetectH, lineDetectV)
-                else:
-                    min_x, min_y, max_x, max_y = textarea[0]                    
-            elif len(textarea) == 1 and (height*width*0.5 < (abs(textarea[0][2]-textarea[0][0]) * abs(textarea[0][3]-textarea[0][1]))):
-                x1, y1, x2, y2 = textarea[0]
-                x1 = x1-20 if x1 > 20 else 0
-                x2 = x2+20 if x2 < width-20 else width
-                y1 = y1-40 if y1 > 40 else 0
-                y2 = y2+40 if y2 < height-40 else height
-
-                #self.save_pf(base, [x1, y1, x2, y2])                
-                min_x, min_y, max_x, max_y = textarea[0]
-            else:
-                min_x, min_y, max_x, max_y = self.select_borderLine(
-                    img_array_rr, lineDetectH, lineDetectV)                
-                        
+        # page frames are detected on the worker pool, but only this
+        # process writes to the workspace (PAGE files and METS)
+        results = imap_ordered(_crop_page, self._jobs(), self.parameter['parallel'],
+                               initializer=_init_worker, initargs=(self.parameter,))
+        for (n, input_file, pcgts, page_id), border in results:
+            min_x, min_y, max_x, max_y = border
+            LOG.info("%s border (%i %i %i %i)", page_id, min_x, min_y, max_x, max_y)
             brd = BorderType(Coords=CoordsType("%i,%i %i,%i %i,%i %i,%i" % (
                 min_x, min_y, max_x, min_y, max_x, max_y, min_x, max_y)))
             pcgts.get_Page().set_Border(brd)
@@ -498,9 +574,40 @@ class OcrdAnybaseocrCropper(Processor):
                                             file_id + '.xml'),
                 content=to_xml(pcgts).encode('utf-8')
             )
-            '''
 
+    def _jobs(self):
+        for (n, input_file) in enumerate(self.input_files):
+            page_id = input_file.pageId or input_file.ID
+            LOG.info("INPUT FILE %i / %s", n, page_id)
+            pcgts = page_from_file(self.workspace.download_file(input_file))
+            metadata = pcgts.get_Metadata()
+            metadata.add_MetadataItem(
+                    MetadataItemType(type_="processingStep",
+                                     name=self.ocrd_tool['steps'][0],
+                                     value=TOOL,
+                                     Labels=[LabelsType(#externalRef="parameters",
+                                                        Label=[LabelType(type_=name,
+                                                                         value=self.parameter[name])
+                                                               for name in self.parameter.keys()])]))
+            page = pcgts.get_Page()
+            page_image, page_xywh, page_image_info = self.workspace.image_from_page(page, page_id)
+            yield (n, input_file, pcgts, page_id), (page_image.filename, page.get_orientation() or 0)
+
+    def _process_segment(self, filename, orientation):
+        """Return the page frame of the image in `filename`, rotated by
+        `orientation` degrees."""
+        image = self.rotate_image(orientation, Image.open(filename))
+        # RGB or single-channel grayscale
+        if image.mode != 'RGB':
+            image = image.convert('L')
+        img_array = ocrolib.pil2array(image)
+        return self.detect_border(img_array)
+
+
+def _init_worker(parameter):
+    global _WORKER
+    _WORKER = OcrdAnybaseocrCropper(None, parameter=parameter)
 
-            
 
-            
\ No newline at end of file
+def _crop_page(filename, orientation):
+    return _WORKER._process_segment(filename, orientation)
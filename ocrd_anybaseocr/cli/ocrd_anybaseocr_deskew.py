@@ -42,17 +42,21 @@
 #!/usr/bin/env python
 
 import os
+from functools import partial
 import numpy as np
-from pylab import amin, amax, linspace, mean, var, plot, ginput, ones, clip, imshow
-from scipy.ndimage import filters, interpolation, morphology
-from scipy import stats
+from pylab import amin, amax, linspace, plot, ginput, clip, imshow, array
+from scipy.ndimage import interpolation
 import ocrolib
 from ..constants import OCRD_TOOL
+from ..skew import rotation_variance, coarse_to_fine_skew, ForegroundProjection, SkewPrior
+from ..thresholds import estimation_mask, estimate_lo_hi
+from ..utils import read_image_gray
 
 from ocrd import Processor
 from ocrd_modelfactory import page_from_file
 from ocrd_models.ocrd_page import (
     to_xml,
+    AlternativeImageType,
     MetadataItemType,
     LabelsType, LabelType
     )
@@ -64,6 +68,8 @@ FALLBACK_IMAGE_GRP = 'OCR-D-IMG-DESKEW'
 
 class OcrdAnybaseocrDeskewer(Processor):
 
+    skew_prior = None
+
     def __init__(self, *args, **kwargs):
         kwargs['ocrd_tool'] = OCRD_TOOL['tools'][TOOL]
         kwargs['version'] = OCRD_TOOL['version']
@@ -74,9 +80,7 @@ class OcrdAnybaseocrDeskewer(Processor):
         estimates = []
 
         for a in angles:
-            v = mean(interpolation.rotate(
-                image, a, order=0, mode='constant'), axis=1)
-            v = var(v)
+            v = rotation_variance(image, a)
             estimates.append((v, a))
         if self.parameter['debug'] > 0:
             plot([y for x, y in estimates], [x for x, y in estimates])
@@ -84,6 +88,13 @@ class OcrdAnybaseocrDeskewer(Processor):
         _, a = max(estimates)
         return a
 
+    def _search_skew(self, est, angles):
+        if self.parameter['skewmethod'] == 'projection':
+            return ForegroundProjection(est).skew(angles)
+        if self.parameter['skewsearch'] == 'coarse-to-fine':
+            return coarse_to_fine_skew(est, angles, self.parameter['skewtolerance'])
+        return self.estimate_skew_angle(est, angles)
+
     def process(self):
         try:
             self.page_grp, self.image_grp = self.output_file_grp.split(',')
@@ -92,6 +103,8 @@ class OcrdAnybaseocrDeskewer(Processor):
             self.image_grp = FALLBACK_IMAGE_GRP
             LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
         oplevel = self.parameter['operation_level']
+        if self.parameter['skewprior']:
+            self.skew_prior = SkewPrior(self.parameter['skewpriorwindow'])
 
         for (n, input_file) in enumerate(self.input_files):
             file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
@@ -128,9 +141,30 @@ class OcrdAnybaseocrDeskewer(Processor):
             )
     
     def _process_segment(self, page, filename, page_id, file_id):                
+        deskewed, angle = self._deskew(filename)
+
+        #TODO: Need some clarification as the results effect the following pre-processing steps.
+        #orientation = -angle
+        #orientation = 180 - ((180 - orientation) % 360)
+        page.set_orientation(angle)
+        
+        bin_array = array(255*(deskewed>ocrolib.midrange(deskewed)),'B')
+        bin_image = ocrolib.array2pil(bin_array)
+        file_path = self.workspace.save_image_file(bin_image,
+                               file_id,
+                               page_id=page_id,
+                               file_grp=self.image_grp
+        )        
+        page.add_AlternativeImage(AlternativeImageType(filename=file_path, comment="deskewed"))
+
+    def _deskew(self, filename):
+        """Deskew and threshold the image in `filename`.
+
+        Returns the thresholded image as boolean array and the skew angle.
+        """
         if self.parameter['parallel'] < 2:
                 LOG.info("INPUT FILE %s ", filename)
-        raw = ocrolib.read_image_gray(filename)
+        raw = read_image_gray(filename, self.parameter['precision'])
 
         flat = raw
         #flat = np.array(binImg)
@@ -145,7 +179,15 @@ class OcrdAnybaseocrDeskewer(Processor):
             est = flat[o0:d0-o0, o1:d1-o1]
             ma = self.parameter['maxskew']
             ms = int(2*self.parameter['maxskew']*self.parameter['skewsteps'])
-            angle = self.estimate_skew_angle(est, linspace(-ma, ma, ms+1))
+            angles = linspace(-ma, ma, ms+1)
+            if self.skew_prior is not None:
+                if self.parameter['skewmethod'] == 'projection':
+                    score = ForegroundProjection(est).variance
+                else:
+                    score = partial(rotation_variance, est)
+                angle = self.skew_prior.estimate(angles, score, partial(self._search_skew, est))
+            else:
+                angle = self._search_skew(est, angles)
             flat = interpolation.rotate(
                 flat, angle, mode='constant', reshape=0)
             flat = amax(flat)-flat
@@ -159,24 +201,19 @@ class OcrdAnybaseocrDeskewer(Processor):
         d0, d1 = flat.shape
         o0, o1 = int(self.parameter['bignore']*d0), int(self.parameter['bignore']*d1)
         est = flat[o0:d0-o0, o1:d1-o1]
+        v = None
         if self.parameter['escale'] > 0:
             # by default, we use only regions that contain
             # significant variance; this makes the percentile
             # based low and high estimates more reliable
-            e = self.parameter['escale']
-            v = est-filters.gaussian_filter(est, e*20.0)
-            v = filters.gaussian_filter(v**2, e*20.0)**0.5
-            v = (v > 0.3*amax(v))
-            v = morphology.binary_dilation(
-                v, structure=ones((int(e*50), 1)))
-            v = morphology.binary_dilation(
-                v, structure=ones((1, int(e*50))))
+            v = estimation_mask(est, self.parameter['escale'])
             if self.parameter['debug'] > 0:
                 imshow(v)
                 ginput(1, self.parameter['debug'])
-            est = est[v]
-        lo = stats.scoreatpercentile(est.ravel(), self.parameter['lo'])
-        hi = stats.scoreatpercentile(est.ravel(), self.parameter['hi'])
+        lo, hi = estimate_lo_hi(est, self.parameter['lo'], self.parameter['hi'], v)
+        if hi <= lo:
+            # nothing to normalize (e.g. a blank page)
+            lo, hi = 0.0, 1.0
         # rescale the image to get the gray scale image
         if self.parameter['parallel'] < 2:
             LOG.info("Rescaling")
@@ -186,24 +223,9 @@ class OcrdAnybaseocrDeskewer(Processor):
         if self.parameter['debug'] > 0:
             imshow(flat, vmin=0, vmax=1)
             ginput(1, self.parameter['debug'])
-        deskewed = 1*(flat > self.parameter['threshold'])
+        deskewed = (flat > self.parameter['threshold'])
 
         # output the normalized grayscale and the thresholded images
         LOG.info("%s lo-hi (%.2f %.2f) angle %4.1f" %
                    (filename, lo, hi, angle))
-        if self.parameter['parallel'] < 2:
-            LOG.info("Writing")
-        #ocrolib.write_image_binary(base+".ds.png", deskewed)
-
-        #TODO: Need some clarification as the results effect the following pre-processing steps.
-        #orientation = -angle
-        #orientation = 180 - ((180 - orientation) % 360)
-        page.set_orientation(angle)
-        
-        file_path = self.workspace.save_image_file(bin_image,
-                               file_id,
-                               page_id=page_id,
-                               file_grp=self.image_grp
-        )        
-        page.add_AlternativeImage(AlternativeImageType(filename=file_path, comment="deskewed"))
-        
+        return deskewed, angle
@@ -1,24 +1,29 @@
-import torch
 import sys
 import os
-import shutil
+from argparse import Namespace
+
+import numpy as np
+import torch
 
 from ..constants import OCRD_TOOL
+from ..utils import prefetch
 
 from ocrd import Processor
-
-from ocrd_models.ocrd_page import parse
-from ocrd_utils import getLogger, concat_padded
 from ocrd_modelfactory import page_from_file
-from ocrd_models.ocrd_page import to_xml,parse
-import shutil
+from ocrd_models.ocrd_page import (
+    to_xml,
+    AlternativeImageType,
+    MetadataItemType,
+    LabelsType, LabelType
+    )
+from ocrd_utils import concat_padded, getLogger, MIMETYPE_PAGE
 
 from pathlib import Path
 from PIL import Image
-import ocrolib
 
 TOOL = 'ocrd-anybaseocr-dewarp'
 LOG = getLogger('OcrdAnybaseocrDewarper')
+FALLBACK_IMAGE_GRP = 'OCR-D-IMG-DEWARP'
 
 class OcrdAnybaseocrDewarper(Processor):
 
@@ -28,15 +33,135 @@ class OcrdAnybaseocrDewarper(Processor):
         super(OcrdAnybaseocrDewarper, self).__init__(*args, **kwargs)
 
     def crop_image(self, image_path, crop_region):
-        img = Image.open(image_path)
-        cropped = img.crop(crop_region)
-        return cropped
+        """RGB array of the image in `image_path`, viewed through the
+        `crop_region` rectangle (x0, y0, x1, y1)."""
+        x0, y0, x1, y1 = crop_region
+        return np.asarray(Image.open(image_path).convert('RGB'))[y0:y1, x0:x1]
 
-    def process(self):        
-        if not torch.cuda.is_available():
-            LOG.error("Your system has no CUDA installed. No GPU detected.")
-            sys.exit(1)
+    def load_generator(self, path):
+        """Build the pix2pixHD generator from the repository at `path` and
+        load the `checkpoint` weights into it, once per processor."""
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+        from models import networks
+        from data.base_dataset import get_params, get_transform
+        from util.util import tensor2im
+        self.get_params, self.get_transform, self.tensor2im = get_params, get_transform, tensor2im
+
+        # as in pix2pixHD's test.py with the options used for the model
+        self.opt = Namespace(
+            resize_or_crop=self.parameter['imgresize'],
+            loadSize=self.parameter['resizeHeight'],
+            fineSize=self.parameter['resizeWidth'],
+            isTrain=False, no_flip=True, netG='global',
+            n_downsample_global=4, n_local_enhancers=2)
+        gpu_id = self.parameter['gpu_id']
+        if gpu_id >= 0 and not torch.cuda.is_available():
+            LOG.warning("No GPU detected, dewarping on the CPU")
+            gpu_id = -1
+        if gpu_id < 0:
+            # a negative id selects the CPU, as in pix2pixHD
+            if self.parameter['threads'] > 0:
+                torch.set_num_threads(self.parameter['threads'])
+            LOG.info("Dewarping on the CPU with %d threads", torch.get_num_threads())
+            self.device, gpu_ids = torch.device('cpu'), []
+        else:
+            self.device, gpu_ids = torch.device('cuda', gpu_id), [gpu_id]
+        netG = networks.define_G(3, 3, 64, 'global', 4, 10, 2, 3, 'instance', gpu_ids=gpu_ids)
+        checkpoint = self.parameter['checkpoint']
+        LOG.info("Loading generator weights from '%s'", checkpoint)
+        netG.load_state_dict(torch.load(checkpoint, map_location=self.device))
+        self.netG = netG.eval()
+
+    def preprocess(self, image):
+        """Input tensor of the generator for RGB array `image`."""
+        image = Image.fromarray(image)
+        transform = self.get_transform(self.opt, self.get_params(self.opt, image.size))
+        return transform(image)
+
+    def generate(self, real):
+        """Run the generator on the batch tensor `real`."""
+        real = real.to(self.device)
+        with torch.no_grad():
+            if self.parameter['jit'] and not isinstance(self.netG, torch.jit.ScriptModule):
+                self.netG = self.trace(real)
+            return self.netG(real)
+
+    def dewarp_batch(self, reals):
+        """Run the generator on a list of input tensors of the same shape
+        in one pass, return the dewarped PIL images."""
+        fake = self.generate(torch.stack(reals))
+        return [Image.fromarray(self.tensor2im(f)) for f in fake]
+
+    def dewarp_tiled(self, image):
+        """Run the generator on overlapping tiles of RGB array `image` at
+        its native resolution, return the tiles blended into one PIL image.
+
+        Tiles are `tileSize` pixels square (or the page size, if smaller),
+        overlap by at least `tileOverlap` pixels and are fed `batchSize` at
+        a time. Across the overlaps, the weight of each tile ramps linearly
+        down to its border, so the seams are feathered.
+        """
+        size, overlap = self.parameter['tileSize'], self.parameter['tileOverlap']
+        h, w = image.shape[:2]
+        out = np.zeros((h, w, 3), dtype=np.float32)
+        weight = np.zeros((h, w, 1), dtype=np.float32)
+        tiles = [(y, x) for y in _tile_starts(h, size, overlap) for x in _tile_starts(w, size, overlap)]
+        # the generator needs sizes divisible by its downsampling factor
+        base = 2 ** self.opt.n_downsample_global
+        for i in range(0, len(tiles), self.parameter['batchSize']):
+            batch = tiles[i:i + self.parameter['batchSize']]
+            reals = []
+            for y, x in batch:
+                tile = image[y:y+size, x:x+size].astype(np.float32)
+                tile = np.pad(tile, ((0, -tile.shape[0] % base), (0, -tile.shape[1] % base), (0, 0)), mode='edge')
+                # as torchvision's ToTensor and Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
+                reals.append(torch.from_numpy(tile.transpose(2, 0, 1) / 127.5 - 1))
+            fake = self.generate(torch.stack(reals)).cpu().numpy()
+            for (y, x), f in zip(batch, fake):
+                th, tw = min(size, h - y), min(size, w - x)
+                wt = np.outer(_feather(th, overlap, y == 0, y + th == h),
+                              _feather(tw, overlap, x == 0, x + tw == w))[..., None]
+                out[y:y+th, x:x+tw] += (f[:, :th, :tw].transpose(1, 2, 0) + 1) * 127.5 * wt
+                weight[y:y+th, x:x+tw] += wt
+        out /= weight
+        return Image.fromarray(np.clip(out.round(), 0, 255).astype(np.uint8))
+
+    def dewarp(self, image):
+        """Run the generator on RGB array `image`, return the dewarped PIL image."""
+        return self.dewarp_batch([self.preprocess(image)])[0]
+
+    def batches(self, pages):
+        """Group `(context, image)` pairs into lists of at most `batchSize`
+        `(context, tensor)` pairs of consecutive pages with the same input
+        shape, so the pages stay in input order.
+
+        Pages are preprocessed as they arrive; a batch is emitted as soon
+        as it is full or the next page has a different shape.
+        """
+        batch = []
+        for context, image in pages:
+            real = self.preprocess(image)
+            if batch and batch[0][1].shape != real.shape:
+                yield batch
+                batch = []
+            batch.append((context, real))
+            if len(batch) >= self.parameter['batchSize']:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
+    def trace(self, example):
+        """TorchScript version of the generator, traced on `example`."""
+        LOG.info("Tracing the generator")
+        traced = torch.jit.trace(self.netG, example)
+        if hasattr(torch.jit, 'freeze'):
+            # inline the weights as constants (torch >= 1.8)
+            traced = torch.jit.freeze(traced)
+        return traced
+
+    def process(self):
         path = Path(self.parameter['pix2pixHD']).absolute()
 
         if not Path(path).is_dir():
@@ -48,43 +173,112 @@ class OcrdAnybaseocrDewarper(Processor):
                 """ % path)
             sys.exit(1)
 
+        size, overlap = self.parameter['tileSize'], self.parameter['tileOverlap']
+        if size > 0 and not 0 <= overlap < size:
+            LOG.error("tileOverlap (%d) must be at least 0 and smaller than tileSize (%d)", overlap, size)
+            sys.exit(1)
+
+        self.load_generator(path)
+
+        try:
+            self.page_grp, self.image_grp = self.output_file_grp.split(',')
+        except ValueError:
+            self.page_grp = self.output_file_grp
+            self.image_grp = FALLBACK_IMAGE_GRP
+            LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
 
-        for (_, input_file) in enumerate(self.input_files):
-            local_input_file = self.workspace.download_file(input_file)
-            pcgts = parse(local_input_file.url, silence=True)
-            image_coords = pcgts.get_Page().get_Border().get_Coords().points.split()
-            fname = pcgts.get_Page().imageFilename
-            LOG.info("INPUT FILE %s", fname)
+        # read the PAGE files here, decode and crop the images in the background
+        pages = []
+        for (n, input_file) in enumerate(self.input_files):
+            pcgts = page_from_file(self.workspace.download_file(input_file))
+            page_id = input_file.pageId or input_file.ID
+            page = pcgts.get_Page()
+            image_coords = page.get_Border().get_Coords().points.split()
 
             # Get page Co-ordinates
             min_x, min_y = image_coords[0].split(",")
             max_x, max_y = image_coords[2].split(",")
-            img_tmp_dir = "OCR-D-IMG/test_A"
-            img_dir = os.path.dirname(str(fname))
-            # Path of pix2pixHD
-            Path(img_tmp_dir).mkdir(parents=True, exist_ok=True)
-
             crop_region = int(min_x), int(
                 min_y), int(max_x), int(max_y)
-            cropped_img = self.crop_image(fname, crop_region)
-
-
-            base, _ = ocrolib.allsplitext(fname)
-            filename = base.split("/")[-1] + ".png"
-            cropped_img.save(img_tmp_dir + "/" + filename)                    
-            
-            os.system("python " + str(path) + "/test.py --dataroot %s --checkpoints_dir ./ --name models --results_dir %s --label_nc 0 --no_instance --no_flip --resize_or_crop none --n_blocks_global 10 --n_local_enhancers 2 --gpu_ids %s --loadSize %d --fineSize %d --resize_or_crop %s" %
-                      (os.path.dirname(img_tmp_dir), img_dir, self.parameter['gpu_id'], self.parameter['resizeHeight'], self.parameter['resizeWidth'], self.parameter['imgresize']))
-            synthesized_image = filename.split(
-                ".")[0] + "_synthesized_image.jpg"
-            pix2pix_img_dir = img_dir + "/models/test_latest/images/"
-            dewarped_image = Path(pix2pix_img_dir + synthesized_image)
-            if(dewarped_image.is_file()):
-                shutil.copy(dewarped_image, img_dir + "/" +
-                            filename.split(".")[0] + ".dw.jpg")
-
-            if(Path(img_tmp_dir).is_dir()):
-                shutil.rmtree(img_tmp_dir)
-            if(Path(img_dir + "/models").is_dir()):
-                shutil.rmtree(img_dir + "/models")
-            
+            pages.append(((n, input_file, pcgts, page_id), crop_region))
+
+        def cropped():
+            for context, crop_region in pages:
+                image = self.crop_image(context[2].get_Page().imageFilename, crop_region)
+                yield context + ((image.shape[1], image.shape[0]),), image
+
+        if self.parameter['tileSize'] > 0:
+            for context, image in prefetch(cropped()):
+                LOG.info("INPUT FILE %s (in tiles)", context[3])
+                self._save_page(context, self.dewarp_tiled(image))
+        else:
+            for batch in prefetch(self.batches(cropped())):
+                contexts, reals = zip(*batch)
+                LOG.info("INPUT FILE %s", ", ".join(context[3] for context in contexts))
+                for context, dewarped in zip(contexts, self.dewarp_batch(list(reals))):
+                    self._save_page(context, dewarped)
+
+    def _save_page(self, context, dewarped):
+        """Add the `dewarped` image to the page as AlternativeImage, and
+        write the PAGE file.
+
+        The image is resized to the crop size if needed, so it matches the
+        Border coordinates.
+        """
+        n, input_file, pcgts, page_id, size = context
+        if dewarped.size != size:
+            dewarped = dewarped.resize(size, Image.BICUBIC)
+        metadata = pcgts.get_Metadata()
+        metadata.add_MetadataItem(
+                MetadataItemType(type_="processingStep",
+                                 name=self.ocrd_tool['steps'][0],
+                                 value=TOOL,
+                                 Labels=[LabelsType(#externalRef="parameters",
+                                                    Label=[LabelType(type_=name,
+                                                                     value=self.parameter[name])
+                                                           for name in self.parameter.keys()])]))
+        file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
+        if file_id == input_file.ID:
+            file_id = concat_padded(self.image_grp, n)
+        file_path = self.workspace.save_image_file(dewarped,
+                                                   file_id + ".dw",
+                                                   page_id=page_id,
+                                                   file_grp=self.image_grp,
+                                                   format=self.parameter['imageFormat'])
+        pcgts.get_Page().add_AlternativeImage(AlternativeImageType(filename=file_path, comment="cropped,dewarped"))
+
+        file_id = input_file.ID.replace(self.input_file_grp, self.page_grp)
+        if file_id == input_file.ID:
+            file_id = concat_padded(self.page_grp, n)
+        self.workspace.add_file(
+            ID=file_id,
+            file_grp=self.page_grp,
+            pageId=input_file.pageId,
+            mimetype=MIMETYPE_PAGE,
+            local_filename=os.path.join(self.page_grp,
+                                        file_id + '.xml'),
+            content=to_xml(pcgts).encode('utf-8')
+        )
+
+
+def _tile_starts(n, size, overlap):
+    """Offsets of tiles of `size` covering `n` pixels with at least
+    `overlap` pixels of overlap (smaller than `size`); the last tile ends
+    at `n`."""
+    if n <= size:
+        return [0]
+    return list(range(0, n - size, size - overlap)) + [n - size]
+
+
+def _feather(n, overlap, first, last):
+    """Blending weights along `n` pixels of a tile, rising linearly over
+    `overlap` pixels at the start (unless `first`) and falling at the end
+    (unless `last`)."""
+    weights = np.ones(n, dtype=np.float32)
+    k = min(overlap, n)
+    ramp = np.arange(1, k + 1, dtype=np.float32) / (overlap + 1)
+    if not first:
+        weights[:k] = np.minimum(weights[:k], ramp)
+    if not last:
+        weights[n-k:] = np.minimum(weights[n-k:], ramp[::-1])
+    return weights
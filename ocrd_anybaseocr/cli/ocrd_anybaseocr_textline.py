@@ -1,13 +1,16 @@
 import sys
 import os
 import re
-import glob
+from numpy import zeros
 from PIL import Image, ImageDraw
 import ocrolib
+from ocrolib import sl
 from re import split
 import os.path
 import json
 from ..constants import OCRD_TOOL
+from ..binary import BinaryImage, midrange_threshold
+from ..gpageseg import default_params, segment, line_images
 
 
 #
@@ -27,6 +30,15 @@ TOOL = 'ocrd-anybaseocr-textline'
 LOG = getLogger('OcrdAnybaseocrTextline')
 
 
+def paste_centered(a, shape):
+    """`a` centered on a background (zeros) of `shape`, cropped if larger."""
+    out = zeros(shape, dtype=a.dtype)
+    oy, ox = (shape[0] - a.shape[0]) // 2, (shape[1] - a.shape[1]) // 2
+    a = a[max(0, -oy):, max(0, -ox):][:shape[0] - max(0, oy), :shape[1] - max(0, ox)]
+    out[max(0, oy):max(0, oy) + a.shape[0], max(0, ox):max(0, ox) + a.shape[1]] = a
+    return out
+
+
 class OcrdAnybaseocrTextline(Processor):
 
     def __init__(self, *args, **kwargs):
@@ -46,20 +58,21 @@ class OcrdAnybaseocrTextline(Processor):
             F.write(d)
 
     def process(self):
+        params = default_params()
+        params.update((key, self.parameter[key]) for key in params if key in self.parameter)
         for (n, input_file) in enumerate(self.input_files):
             pcgts = page_from_file(self.workspace.download_file(input_file))
             page_id = pcgts.pcGtsId or input_file.pageId or input_file.ID
             page = pcgts.get_Page()
             LOG.info("INPUT FILE %s", input_file.pageId or input_file.ID)
             page_image, page_xywh, _ = self.workspace.image_from_page(page, page_id)            
-            image = ocrolib.read_image_binary(page_image.filename)
-            height, width = image.shape
+            width, height = page_image.size
             H = height
             W = width
             base, _ = ocrolib.allsplitext(page_image.filename)
             
             if not os.path.exists("%s/lines" % base):                
-                os.system("mkdir -p %s/lines" % base)
+                os.makedirs("%s/lines" % base)
                 # if os.path.exists(base2 + ".ts.png") :
                 #    f = ocrolib.read_image_binary(base2 + ".ts.png")
                 #    height, width = f.shape
@@ -95,44 +108,34 @@ class OcrdAnybaseocrTextline(Processor):
                 (x0, y0, x1, y1, i) = block
                 y0 = -y0
                 #blockImage = "%s/block-%03d" % (base, i)
-                os.system("convert %s.ts.png %s/temp.png" % (base, base))
                 img = Image.open("%s.ts.png" % base, 'r')
                 img_w, img_h = img.size
-                background = Image.new('RGBA', (W, H), (255, 255, 255, 255))
                 draw = ImageDraw.Draw(img)
-                bg_w, bg_h = background.size
-                offX = (bg_w - img_w) // 2
-                offY = (bg_h - img_h) // 2
-                offset = (offX, offY)
-                background.paste(img, offset)
-                background.save("%s/temp.png" % base)
-                command = "python "+ self.parameter['libpath'] + "anyBaseOCR-gpageseg.py %s/temp.png -n --minscale %f --maxlines %f --scale %f --hscale %f --vscale %f --threshold %f --noise %d --maxseps %d --sepwiden %d --maxcolseps %d --csminaspect %f --csminheight %f -p %d -e %d -Q %d" % (
-                    base, self.parameter['minscale'], self.parameter['maxlines'], self.parameter['scale'], self.parameter['hscale'], self.parameter['vscale'], self.parameter['threshold'], self.parameter['noise'], self.parameter['maxseps'], self.parameter['sepwiden'], self.parameter['maxcolseps'], self.parameter['csminaspect'], self.parameter['csminheight'], self.parameter['pad'], self.parameter['expand'], self.parameter['parallel'])
-                if(self.parameter['blackseps']):
-                    command = command + " -b"
-                if(self.parameter['usegauss']):
-                    command = command + " --usegauss"
-                os.system(command)
-                pseg = ocrolib.read_page_segmentation("%s/temp.pseg.png" % base)
-                regions = ocrolib.RegionExtractor()
-                regions.setPageLines(pseg)
-                file = open('%s/sorted_lines.dat' % base, 'w')                
-                for h in range(1, regions.length()):
-                    id = regions.id(h)
-                    y0, x0, y1, x1 = regions.bbox(h)
-                    l = str(int(x0 - offX)) + " " + str(int(img_h - (y1 - offY))) + " " + str(int(x1 - offX)) + " " + str(int(img_h - (y0 - offY))) + " 0 0 0 0\n"
-                    rect = list(map(int,l.split(" ")[:4]))
-                    draw.rectangle(rect, fill = None, outline="#0000ff", width = 5)
-                    file.write(l)
-                filelist = glob.glob("%s/temp/*" % base)
-                for infile in sorted(filelist):
-                    os.system("convert %s %s/lines/01%02x%02x.bin.png" % (infile, base, i + 1, j + 1))
-                    lines.append("%s/lines/01%02x%02x.bin.png" % (base, i + 1, j + 1))
+                # the text part, centered on a page sized background
+                offX = (W - img_w) // 2
+                offY = (H - img_h) // 2
+                binary = BinaryImage.from_pil(img, midrange_threshold(img)).array
+                binary = paste_centered(binary, (H, W))
+                try:
+                    _, seglines, _ = segment(binary, params)
+                except ValueError as err:
+                    LOG.warning("Skipping block %d of %s: %s", i, page_id, err)
+                    continue
+                with open('%s/sorted_lines.dat' % base, 'w') as file:
+                    for line in seglines:
+                        y0, y1, x0, x1 = sl.raster(line.bounds)
+                        l = str(int(x0 - offX)) + " " + str(int(img_h - (y1 - offY))) + " " + str(int(x1 - offX)) + " " + str(int(img_h - (y0 - offY))) + " 0 0 0 0\n"
+                        rect = list(map(int,l.split(" ")[:4]))
+                        draw.rectangle(rect, fill = None, outline="#0000ff", width = 5)
+                        file.write(l)
+                for binline in line_images(binary, seglines, params):
+                    lines.append(("%s/lines/01%02x%02x.bin.png" % (base, i + 1, j + 1), binline))
                     j += 1
-                img.save("%s.tl.png" % base)                
-                os.system("rm -r %s/temp/" % base)
-                os.system("rm %s/temp.png %s/temp.pseg.png" % (base, base))
+                img.save("%s.tl.png" % base)
                 i += 1
 
+            for fname, binline in lines:
+                ocrolib.write_image_binary(fname, binline)
+
             # return lines
 
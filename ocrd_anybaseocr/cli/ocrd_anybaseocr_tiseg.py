@@ -8,24 +8,28 @@
 # URL - https://www.dfki.de/fileadmin/user_upload/import/9512_ICDAR2017_anyOCR.pdf
 
 
-from scipy import ones, zeros, array, where, shape, ndimage, logical_or, logical_and
-import copy
-from pylab import unique
-import ocrolib
-import json
+from numpy import ones, zeros
+from scipy import ndimage
 from PIL import Image
 import os
 
 
 from ..constants import OCRD_TOOL
+from ..binary import BinaryImage, reduce_rank
 
 from ocrd import Processor
 from ocrd_modelfactory import page_from_file
-from ocrd_models.ocrd_page import to_xml, parse
-from ocrd_utils import concat_padded, getLogger
+from ocrd_models.ocrd_page import (
+    to_xml,
+    AlternativeImageType,
+    MetadataItemType,
+    LabelsType, LabelType
+    )
+from ocrd_utils import concat_padded, getLogger, MIMETYPE_PAGE
 
 TOOL = 'ocrd-anybaseocr-tiseg'
 LOG = getLogger('OcrdAnybaseocrTiseg')
+FALLBACK_IMAGE_GRP = 'OCR-D-IMG-TISEG'
 
 class OcrdAnybaseocrTiseg(Processor):
 
@@ -40,27 +44,32 @@ class OcrdAnybaseocrTiseg(Processor):
         return cropped
 
     def process(self):
+        try:
+            self.page_grp, self.image_grp = self.output_file_grp.split(',')
+        except ValueError:
+            self.page_grp = self.output_file_grp
+            self.image_grp = FALLBACK_IMAGE_GRP
+            LOG.info("No output file group for images specified, falling back to '%s'", FALLBACK_IMAGE_GRP)
+
         for (n, input_file) in enumerate(self.input_files):
             pcgts = page_from_file(self.workspace.download_file(input_file))
-            page_id = pcgts.pcGtsId or input_file.pageId or input_file.ID
+            page_id = input_file.pageId or input_file.ID
             page = pcgts.get_Page()
-            LOG.info("INPUT FILE %s", input_file.pageId or input_file.ID)
-            page_image, page_xywh, _ = self.workspace.image_from_page(page, page_id)            
-            # image_coords = pcgts.get_Page().get_Border().get_Coords().points.split()
-
-            # why does it return Image type when there is data (border info from crop)
-            print("----------", type(page_image), page_xywh)
-
-            # I: binarized-input-image; imftext: output-text-portion.png; imfimage: output-image-portion.png
-            '''
-            min_x, min_y = image_coords[0].split(",")
-            max_x, max_y = image_coords[2].split(",")
-            crop_region = int(min_x), int(
-                min_y), int(max_x), int(max_y)
-            cropped_img = self.crop_image(page_image.filename, crop_region)
-
-            I = ocrolib.pil2array(cropped_img)
-            I = 1-I/I.max()
+            LOG.info("INPUT FILE %s", page_id)
+            metadata = pcgts.get_Metadata()
+            metadata.add_MetadataItem(
+                    MetadataItemType(type_="processingStep",
+                                     name=self.ocrd_tool['steps'][0],
+                                     value=TOOL,
+                                     Labels=[LabelsType(#externalRef="parameters",
+                                                        Label=[LabelType(type_=name,
+                                                                         value=self.parameter[name])
+                                                               for name in self.parameter.keys()])]))
+            # the page image is already cropped to the Border, if any
+            page_image, page_xywh, _ = self.workspace.image_from_page(page, page_id)
+
+            # I: binarized-input-image (True for foreground)
+            I = BinaryImage.from_pil(page_image).array
             rows, cols = I.shape
 
             # Generate Mask and Seed Images
@@ -76,28 +85,26 @@ class OcrdAnybaseocrTiseg(Processor):
             # Expansion of Iseedfill to become equal in size of I
             Iseedfill = self.expansion(Iseedfill, (rows, cols))
 
-            # Write  Text and Non-Text images
-            image_part = array((1-I*Iseedfill), dtype=int)
-            image_part[0, 0] = 0  # only for visualisation purpose
-            text_part = array((1-I*(1-Iseedfill)), dtype=int)
-            text_part[0, 0] = 0  # only for visualisation purpose
-
-            base, _ = ocrolib.allsplitext(fname)
-            ocrolib.write_image_binary(base + ".ts.png", text_part)
+            # Write the text part (foreground outside of images)
+            text_part = BinaryImage(I & ~Iseedfill)
+            file_id = input_file.ID.replace(self.input_file_grp, self.image_grp)
+            if file_id == input_file.ID:
+                file_id = concat_padded(self.image_grp, n)
+            file_path = self.workspace.save_image_file(text_part.to_pil(),
+                                                       file_id + ".ts",
+                                                       page_id=page_id,
+                                                       file_grp=self.image_grp)
+            comment = "cropped,non-text-removed" if page.get_Border() else "non-text-removed"
+            page.add_AlternativeImage(AlternativeImageType(filename=file_path, comment=comment))
 
-            #imf_image = imf[0:-3] + "nts.png"
-            #ocrolib.write_image_binary(base + ".nts.png", image_part)
-            # return [base + ".ts.png", base + ".nts.png"]
             file_id = input_file.ID.replace(self.input_file_grp, self.output_file_grp)
             if file_id == input_file.ID:
                 file_id = concat_padded(self.output_file_grp, n)
-                
             self.workspace.add_file(
                 ID=file_id,
                 file_grp=self.output_file_grp,
                 pageId=input_file.pageId,
-                mimetype="image/png",
-                url=base + ".ts.png",
+                mimetype=MIMETYPE_PAGE,
                 local_filename=os.path.join(self.output_file_grp,
                                             file_id + '.xml'),
                 content=to_xml(pcgts).encode('utf-8')
@@ -109,59 +116,31 @@ class OcrdAnybaseocrTiseg(Processor):
         Imask = ndimage.binary_fill_holes(Imask)
         Iseed = self.reduction_T_4(Imask)
         Iseed = self.reduction_T_3(Iseed)
-        mask = array(ones((5, 5)), dtype=int)
+        mask = ones((5, 5), dtype=bool)
         Iseed = ndimage.binary_opening(Iseed, mask)
         Iseed = self.expansion(Iseed, Imask.shape)
         return Imask, Iseed
 
     def pixSeedfillBinary(self, Imask, Iseed):
-        Iseedfill = copy.deepcopy(Iseed)
         s = ones((3, 3))
         Ijmask, k = ndimage.label(Imask, s)
-        Ijmask2 = Ijmask * Iseedfill
-        A = list(unique(Ijmask2))
-        A.remove(0)
-        for i in range(0, len(A)):
-            x, y = where(Ijmask == A[i])
-            Iseedfill[x, y] = 1
-        return Iseedfill
+        # lookup table of the mask components that contain a seed
+        seeded = zeros(k+1, dtype=bool)
+        seeded[Ijmask[Iseed]] = True
+        seeded[0] = False
+        return Iseed | seeded[Ijmask]
 
     def reduction_T_1(self, I):
-        A = logical_or(I[0:-1:2, :], I[1::2, :])
-        A = logical_or(A[:, 0:-1:2], A[:, 1::2])
-        return A
+        return reduce_rank(I, 1)
 
     def reduction_T_2(self, I):
-        A = logical_or(I[0:-1:2, :], I[1::2, :])
-        A = logical_and(A[:, 0:-1:2], A[:, 1::2])
-        B = logical_and(I[0:-1:2, :], I[1::2, :])
-        B = logical_or(B[:, 0:-1:2], B[:, 1::2])
-        C = logical_or(A, B)
-        return C
+        return reduce_rank(I, 2)
 
     def reduction_T_3(self, I):
-        A = logical_or(I[0:-1:2, :], I[1::2, :])
-        A = logical_and(A[:, 0:-1:2], A[:, 1::2])
-        B = logical_and(I[0:-1:2, :], I[1::2, :])
-        B = logical_or(B[:, 0:-1:2], B[:, 1::2])
-        C = logical_and(A, B)
-        return C
+        return reduce_rank(I, 3)
 
     def reduction_T_4(self, I):
-        A = logical_and(I[0:-1:2, :], I[1::2, :])
-        A = logical_and(A[:, 0:-1:2], A[:, 1::2])
-        return A
+        return reduce_rank(I, 4)
 
     def expansion(self, I, rows_cols):
-        r, c = I.shape
-        rows, cols = rows_cols
-        A = zeros((rows, cols))
-        A[0:4*r:4, 0:4*c:4] = I
-        A[1:4*r:4, :] = A[0:4*r:4, :]
-        A[2:4*r:4, :] = A[0:4*r:4, :]
-        A[3:4*r:4, :] = A[0:4*r:4, :]
-        A[:, 1:4*c:4] = A[:, 0:4*c:4]
-        A[:, 2:4*c:4] = A[:, 0:4*c:4]
-        A[:, 3:4*c:4] = A[:, 0:4*c:4]
-        return A
-    '''
\ No newline at end of file
+        return BinaryImage(I).expand(4, rows_cols).array
@@ -0,0 +1,489 @@
+"""
+Text line segmentation of binarized pages (anyBaseOCR's variant of
+ocropus-gpageseg).
+
+`segment` runs the whole pipeline on a page and returns the line label
+image and the lines in reading order; `compute_segmentation` does the
+column and line finding for a given scale. The parameters are passed as a
+dict with the keys of `default_params`. The command line interface is in
+anyBaseOCR-gpageseg.py.
+"""
+
+# TODO:
+# ! add option for padding
+# - fix occasionally missing page numbers
+# - treat large h-whitespace as separator
+# - handle overlapping candidates
+# - use cc distance statistics instead of character scale
+# - page frame detection
+# - read and use text image segmentation mask
+# - pick up stragglers
+# ? laplacian as well
+
+from numpy import (amax, arange, array, ascontiguousarray, concatenate, cumsum, diff, dtype, flatnonzero, isnan,
+                   maximum, mean, median, minimum, ones, repeat, searchsorted, transpose, where, zeros)
+from scipy.ndimage import measurements
+from scipy.ndimage.filters import gaussian_filter, uniform_filter, maximum_filter
+import imageio
+import ocrolib
+from ocrolib import psegutils, morph, sl
+
+from ocrd_utils import getLogger
+
+__all__ = ['default_params', 'check_page', 'compute_segmentation', 'segment', 'line_images']
+
+LOG = getLogger('ocrd_anybaseocr.gpageseg')
+
+
+def default_params():
+    """Segmentation parameters with their default values."""
+    return {
+        'minscale': 8.0,  # default was 12.0, Mohsin with Ajraf and Saqib chnaged it into 8.0
+        'maxlines': 300,
+        'scale': 0.0,
+        'hscale': 1.0,
+        'vscale': 1.7,
+        'threshold': 0.2,
+        'noise': 8,
+        'usegauss': False,
+        'maxseps': 2,
+        'sepwiden': 10,
+        'blackseps': False,
+        'maxcolseps': 2,
+        'csminaspect': 1.1,
+        'csminheight': 6.5,
+        'pad': 3,
+        'expand': 3,
+        'precision': 'float64',
+        'debug': False,
+    }
+
+
+def norm_max(v):
+    return v/amax(v)
+
+
+def check_page(image):
+    if len(image.shape) == 3:
+        return "input image is color image %s" % (image.shape,)
+    if mean(image) < median(image):
+        return "image may be inverted"
+    h, w = image.shape
+    if h < 600:
+        return "image not tall enough for a page image %s" % (image.shape,)
+    if h > 10000:
+        return "image too tall for a page image %s" % (image.shape,)
+    if w < 600:
+        return "image too narrow for a page image %s" % (image.shape,)
+    if w > 10000:
+        return "line too wide for a page image %s" % (image.shape,)
+    slots = int(w*h*1.0/(30*30))
+    _, ncomps = measurements.label(image > mean(image))
+    if ncomps < 10:
+        return "too few connected components for a page image (got %d)" % (ncomps,)
+    if ncomps > slots:
+        return "too many connnected components for a page image (%d > %d)" % (ncomps, slots)
+    return None
+
+
+def B(a):
+    if a.dtype == dtype('B'):
+        return a
+    return array(a, 'B')
+
+
+def F(a, precision='float64'):
+    return array(a, precision)
+
+
+def DSAVE(title, image, params):
+    if not params['debug']:
+        return
+    if type(image) == list:
+        assert len(image) == 3
+        image = transpose(array(image), [1, 2, 0])
+    fname = "_"+title+".png"
+    LOG.debug("writing %s", fname)
+    imageio.imwrite(fname, image)
+
+
+################################################################
+# Column finding.
+###
+# This attempts to find column separators, either as extended
+# vertical black lines or extended vertical whitespace.
+# It will work fairly well in simple cases, but for unusual
+# documents, you need to tune the parameters.
+################################################################
+
+def compute_separators_morph(binary, scale, params):
+    """Finds vertical black lines corresponding to column separators."""
+    d0 = int(max(5, scale/4))
+    d1 = int(max(5, scale))+params['sepwiden']
+    thick = morph.r_dilation(binary, (d0, d1))
+    vert = morph.rb_opening(thick, (10*scale, 1))
+    vert = morph.r_erosion(vert, (d0//2, params['sepwiden']))
+    vert = morph.select_regions(vert, sl.dim1, min=3, nbest=2*params['maxseps'])
+    vert = morph.select_regions(vert, sl.dim0, min=20*scale, nbest=params['maxseps'])
+    return vert
+
+
+def compute_colseps_morph(binary, scale, params, maxseps=3, minheight=20, maxwidth=5):
+    """Finds extended vertical whitespace corresponding to column separators
+    using morphological operations."""
+    boxmap = psegutils.compute_boxmap(binary, scale, (0.4, 5), dtype='B')
+    bounds = morph.rb_closing(B(boxmap), (int(5*scale), int(5*scale)))
+    bounds = maximum(B(1-bounds), B(boxmap))
+    cols = 1-morph.rb_closing(boxmap, (int(20*scale), int(scale)))
+    cols = morph.select_regions(cols, sl.aspect, min=params['csminaspect'])
+    cols = morph.select_regions(cols, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps'])
+    cols = morph.r_erosion(cols, (int(0.5+scale), 0))
+    cols = morph.r_dilation(cols, (int(0.5+scale), 0), origin=(int(scale/2)-1, 0))
+    return cols
+
+
+def compute_colseps_mconv(binary, params, scale=1.0):
+    """Find column separators using a combination of morphological
+    operations and convolution."""
+    h, w = binary.shape
+    smoothed = gaussian_filter(F(binary, params['precision']), (scale, scale*0.5))
+    smoothed = uniform_filter(smoothed, (5.0*scale, 1))
+    thresh = (smoothed < amax(smoothed)*0.1)
+    DSAVE("1thresh", thresh, params)
+    blocks = morph.rb_closing(binary, (int(4*scale), int(4*scale)))
+    DSAVE("2blocks", blocks, params)
+    seps = minimum(blocks, thresh)
+    seps = morph.select_regions(seps, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps'])
+    DSAVE("3seps", seps, params)
+    blocks = morph.r_dilation(blocks, (5, 5))
+    DSAVE("4blocks", blocks, params)
+    seps = maximum(seps, 1-blocks)
+    DSAVE("5combo", seps, params)
+    return seps
+
+
+def fill_gaps(a, maxgap):
+    """Fill the gaps (runs of values other than 1) of at most `maxgap`
+    pixels along the rows of `a` that are followed by a 1, in place.
+
+    This is the result of the original pixel loop, including a quirk: it
+    filled each gap together with the pixel before it, which for a gap at
+    the start of a row is the last pixel of the row (index -1). That pixel
+    then counts as a 1 and may close the gap at the end of the row.
+    """
+    one = (a == 1)
+    h, w = one.shape
+    first = one.argmax(axis=1)
+    wrap = one[arange(h), first] & (first > 0) & (first <= maxgap)
+    one[wrap, -1] = True
+    a[wrap, -1] = 1
+    # gaps as runs of the flattened rows, which are separated by a 1 each
+    padded = ones((h, w+1), bool)
+    padded[:, :w] = one
+    gaps = zeros(h*(w+1)+2, 'b')
+    gaps[1:-1] = ~padded.ravel()
+    edges = diff(gaps)
+    starts, ends = flatnonzero(edges == 1), flatnonzero(edges == -1)
+    keep = (ends - starts <= maxgap) & (ends % (w+1) != w)
+    marks = zeros(h*(w+1)+1, 'b')
+    marks[starts[keep]] = 1
+    marks[ends[keep]] = -1
+    filled = cumsum(marks[:-1], dtype='b').reshape(h, w+1)[:, :w]
+    a[filled != 0] = 1
+    return a
+
+
+def compute_colseps_conv(binary, params, scale=1.0):
+    """Find column separators by convoluation and
+    thresholding."""
+    h, w = binary.shape
+    # find vertical whitespace by thresholding
+    smoothed = gaussian_filter(F(binary, params['precision']), (scale, scale*0.5))
+    smoothed = uniform_filter(smoothed, (5.0*scale, 1))
+    thresh = (smoothed < amax(smoothed)*0.1)
+    ####imsave('/home/gupta/Documents/1_thresh.png', thresh)
+    # DSAVE("1thresh",thresh)
+    # find column edges by filtering
+
+#
+    grad = gaussian_filter(F(binary, params['precision']), (scale, scale*0.5), order=(0, 1))
+    grad = uniform_filter(grad, (10.0*scale, 1))
+    # grad = abs(grad) # use this for finding both edges
+    grad = (grad > 0.25*amax(grad))
+    grad1 = morph.select_regions(grad, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps']+10)
+
+    ####imsave('/home/gupta/Documents/2_grad.png', grad1)
+    x = (1-thresh)*(1-grad1)
+    thresh11 = (1-thresh)*x
+    ####imsave('/home/gupta/Documents/3_x.png', thresh11)
+
+    #############################################################################################################
+    # fill horizontal gaps of up to 50 pixels
+    fill_gaps(thresh11, 50)
+
+    y = 1-(thresh11*(1-thresh))
+    ####imsave('/home/gupta/Documents/4_uniformed.png', y)
+
+    #############################################################################################################
+
+    # DSAVE("2grad",grad)
+    # combine edges and whitespace
+    seps = minimum(thresh, maximum_filter(grad, (int(scale), int(5*scale))))
+    seps = maximum_filter(seps, (int(2*scale), 1))
+#
+    ####imsave('/home/gupta/Documents/5_seps.png', seps)
+    h, w = seps.shape
+    smoothed = gaussian_filter(F(seps, params['precision']), (scale, scale*0.5))
+    smoothed = uniform_filter(smoothed, (5.0*scale, 1))
+    seps1 = (smoothed < amax(smoothed)*0.1)
+    ####imsave('/home/gupta/Documents/6_smooth.png', seps1)
+    seps1 = 1-seps1
+#
+    ####imsave('/home/gupta/Documents/7_smooth.png', seps1)
+    seps1 = (grad)*seps1
+    ####imsave('/home/gupta/Documents/8_multigrad.png', seps1)
+
+    #############################################################################################################
+    # fill vertical gaps of up to 400 pixels
+    fill_gaps(seps1.T, 400)  # by making it 300 u can improve
+
+    ####imsave('/home/gupta/Documents/9_uniformed.png', seps1)
+    #############################################################################################################
+
+    seps1 = morph.select_regions(seps1, sl.dim0, min=params['csminheight']*scale, nbest=params['maxcolseps']+10)
+    ####imsave('/home/gupta/Documents/10_seps1.png', seps1)
+#
+    # seps2=seps1*y
+    # t=seps1*(1-y)
+    ####imsave('/home/gupta/Documents/t.png', t)
+    ####imsave('/home/gupta/Documents/s.png', seps2)
+
+#
+    seps1 = (seps1*(1-y))+seps1
+    seps1[seps1 != 0] = 1
+    ####imsave('/home/gupta/Documents/11_testing.png', 0.7*seps1+0.3*binary)
+    # f=(seps1-seps2)+seps1
+
+    #############################################################################################################
+    # fill vertical gaps of up to 350 pixels
+    fill_gaps(seps1.T, 350)
+
+    ####imsave('/home/gupta/Documents/12_uniformed.png', seps1)
+    #############################################################################################################
+
+    ####imsave('/home/gupta/Documents/13_col_sep.png', seps1)
+    return seps1
+
+
+def compute_colseps(binary, scale, params):
+    """Computes column separators either from vertical black lines or whitespace."""
+    colseps = compute_colseps_conv(binary, params, scale)
+    ####imsave('/home/gupta/Documents/colwsseps.png', 0.7*colseps+0.3*binary)
+    # DSAVE("colwsseps",0.7*colseps+0.3*binary)
+    if params['blackseps']:
+        seps = compute_separators_morph(binary, scale, params)
+        ####imsave('/home/gupta/Documents/colseps.png', 0.7*seps+0.3*binary)
+        # DSAVE("colseps",0.7*seps+0.3*binary)
+        #colseps = compute_colseps_morph(binary,scale)
+        colseps = maximum(colseps, seps)
+        binary = minimum(binary, 1-seps)
+    return colseps, binary
+
+
+################################################################
+# Text Line Finding.
+###
+# This identifies the tops and bottoms of text lines by
+# computing gradients and performing some adaptive thresholding.
+# Those components are then used as seeds for the text lines.
+################################################################
+
+def compute_gradmaps(binary, scale, params):
+    # use gradient filtering to find baselines
+    boxmap = psegutils.compute_boxmap(binary, scale, (0.4, 5))
+    cleaned = boxmap*binary
+    ####imsave('/home/gupta/Documents/cleaned.png', cleaned)
+    ####imsave('/home/gupta/Documents/boxmap.png', boxmap)
+    # DSAVE("cleaned",cleaned)
+    if params['usegauss']:
+        # this uses Gaussians
+        grad = gaussian_filter(F(cleaned, params['precision']), (params['vscale']*0.3*scale,
+                                             params['hscale']*6*scale), order=(1, 0))
+    else:
+        # this uses non-Gaussian oriented filters
+        grad = gaussian_filter(F(cleaned, params['precision']), (max(4, params['vscale']*0.3*scale),
+                                             params['hscale']*scale), order=(1, 0))
+        grad = uniform_filter(grad, (params['vscale'], params['hscale']*6*scale))
+    bottom = ocrolib.norm_max((grad < 0)*(-grad))
+    top = ocrolib.norm_max((grad > 0)*grad)
+    testseeds = zeros(binary.shape, 'i')
+    ####imsave('/home/gupta/Documents/grad.png', grad)
+    ####imsave('/home/gupta/Documents/top.png', [testseeds,1.0*top,binary])
+    ####imsave('/home/gupta/Documents/bottom.png', [testseeds,1.0*bottom,binary])
+    return bottom, top, boxmap
+
+
+def mark_line_seeds(bmarked, tmarked, delta, maxheight):
+    """Mark line seeds in every column, given the baseline (bottom) and
+    xheight (top) candidates `bmarked` and `tmarked`.
+
+    In each column, the `delta` pixels above every baseline are marked, and
+    so is the space up to the closest candidate above it if that is an
+    xheight (and not also a baseline) closer than `maxheight`; if there is
+    no candidate above, the top of the page counts as an xheight. As in
+    the original column loop, a baseline less than `delta` pixels from the
+    top only gets its `delta` pixels if the page is shorter than `delta`.
+    """
+    h, w = bmarked.shape
+    # candidates in column-major order, at flat index x*h+y
+    b = ascontiguousarray(bmarked.T).ravel() != 0
+    t = ascontiguousarray(tmarked.T).ravel() != 0
+    cands = flatnonzero(b | t)
+    ends = flatnonzero(b)
+    # closest candidate above every baseline in the same column
+    above = cands[maximum(searchsorted(cands, ends) - 1, 0)]
+    tops = ends - ends % h
+    found = (above >= tops) & (above < ends)
+    y1 = where(found, above, tops)
+    gap = ~t[ends] & ~(found & b[above]) & (ends - y1 < maxheight)
+    # slice start of y-delta with Python's semantics for negative values
+    y = ends % h
+    y0 = y - delta
+    y0 = maximum(where(y0 < 0, y0 + h, y0), 0)
+    band = y0 < y
+    # paint the intervals [starts, ends) pixel by pixel
+    starts = concatenate((y1[gap], tops[band] + y0[band]))
+    ends = concatenate((ends[gap], ends[band]))
+    lengths = ends - starts
+    seeds = zeros(w*h, 'i')
+    seeds[repeat(starts - cumsum(lengths) + lengths, lengths) + arange(lengths.sum())] = 1
+    return seeds.reshape(w, h).T.copy()
+
+
+def compute_line_seeds(binary, bottom, top, colseps, scale, params):
+    """Base on gradient maps, computes candidates for baselines
+    and xheights.  Then, it marks the regions between the two
+    as a line seed."""
+    t = params['threshold']  # 0.2###############################################################more focus here for bigger fonts.!!!
+    # print "SbU", t
+    vrange = int(params['vscale']*scale)
+    bmarked = maximum_filter(bottom == maximum_filter(bottom, (vrange, 0)), (2, 2))
+    bmarked *= array((bottom > t*amax(bottom)*t)*(1-colseps), dtype=bool)
+    tmarked = maximum_filter(top == maximum_filter(top, (vrange, 0)), (2, 2))
+    tmarked *= array((top > t*amax(top)*t/2)*(1-colseps), dtype=bool)
+    tmarked = maximum_filter(tmarked, (1, 20))
+    testseeds = zeros(binary.shape, 'i')
+    delta = max(3, int(scale/2))
+    seeds = mark_line_seeds(bmarked, tmarked, delta, 5*scale)
+    seeds = maximum_filter(seeds, (1, int(1+scale)))
+    seeds *= (1-colseps)
+    ###
+    ####imsave('/home/gupta/Documents/seeds.png', seeds)
+    ####imsave('/home/gupta/Documents/top_bottom.png', [testseeds,0.3*tmarked+0.7*bmarked,binary])
+    ###
+    ####imsave('/home/gupta/Documents/lineseeds.png', [seeds,0.3*tmarked+0.7*bmarked,binary])
+    # DSAVE("lineseeds",[seeds,0.3*tmarked+0.7*bmarked,binary])
+    seeds, _ = morph.label(seeds)
+    return seeds
+
+
+################################################################
+# The complete line segmentation process.
+################################################################
+
+def remove_hlines(binary, scale, maxsize=10):
+    labels, _ = morph.label(binary)
+    objects = morph.find_objects(labels)
+    for i, b in enumerate(objects):
+        if sl.width(b) > maxsize*scale:
+            labels[b][labels[b] == i+1] = 0
+    return array(labels != 0, 'B')
+
+
+def compute_segmentation(binary, scale, params):
+    """Given a binary image, compute a complete segmentation into
+    lines, computing both columns and text lines.
+
+    Returns the label image of the lines (unordered)."""
+    binary = array(binary, 'B')
+
+    # start by removing horizontal black lines, which only
+    # interfere with the rest of the page segmentation
+    binary = remove_hlines(binary, scale)
+
+    # do the column finding
+    LOG.debug("computing column separators")
+    colseps, binary = compute_colseps(binary, scale, params)
+
+    # now compute the text line seeds
+    LOG.debug("computing lines")
+    bottom, top, boxmap = compute_gradmaps(binary, scale, params)
+    seeds = compute_line_seeds(binary, bottom, top, colseps, scale, params)
+    ####imsave('/home/gupta/Documents/combinedseeds.png', [bottom,top,boxmap])
+    # DSAVE("seeds",[bottom,top,boxmap])
+
+    # spread the text line seeds to all the remaining
+    # components
+    LOG.debug("propagating labels")
+    llabels = morph.propagate_labels(boxmap, seeds, conflict=0)
+    LOG.debug("spreading labels")
+    spread = morph.spread_labels(seeds, maxdist=scale)
+    llabels = where(llabels > 0, llabels, spread*binary)
+    segmentation = llabels*binary
+    return segmentation
+
+
+################################################################
+# Processing a page.
+################################################################
+
+def segment(binary, params):
+    """Segment the page `binary` (1 for foreground) into text lines.
+
+    Estimates the scale (unless given in `params`), computes the line
+    segmentation and renumbers the lines in reading order: line `i` (from
+    0) gets the label 0x010000+i+1, as in ocropus page segmentations.
+
+    Returns the label image, the lines (`psegutils.record`s in reading
+    order) and the scale. Raises `ValueError` if the scale is out of
+    bounds or there are too many lines.
+    """
+    binary = array(binary, 'B')
+    if params['scale'] == 0:
+        scale = psegutils.estimate_scale(binary)
+    else:
+        scale = params['scale']
+    LOG.debug("scale %s", scale)
+    if isnan(scale) or scale > 1000.0:
+        raise ValueError("bad scale (%g)" % scale)
+    if scale < params['minscale']:
+        raise ValueError("scale (%g) less than minscale" % scale)
+
+    # find columns and text lines
+    LOG.debug("computing segmentation")
+    segmentation = compute_segmentation(binary, scale, params)
+    if amax(segmentation) > params['maxlines']:
+        raise ValueError("too many lines (%d)" % amax(segmentation))
+    LOG.debug("number of lines %d", amax(segmentation))
+
+    # compute the reading order
+    LOG.debug("finding reading order")
+    lines = psegutils.compute_lines(segmentation, scale)
+    order = psegutils.reading_order([l.bounds for l in lines])
+    lsort = psegutils.topsort(order)
+
+    # renumber the labels so that they conform to the specs
+    nlabels = amax(segmentation)+1
+    renumber = zeros(nlabels, 'i')
+    for i, v in enumerate(lsort):
+        renumber[lines[v].label] = 0x010000+(i+1)
+    segmentation = renumber[segmentation]
+    return segmentation, [lines[i] for i in lsort], scale
+
+
+def line_images(binary, lines, params):
+    """Binary images (0 for foreground) of `lines` cut from the page
+    `binary` (1 for foreground), with small noise removed."""
+    cleaned = ocrolib.remove_noise(array(binary, 'B'), params['noise'])
+    return [psegutils.extract_masked(1-cleaned, l, pad=params['pad'], expand=params['expand'])
+            for l in lines]
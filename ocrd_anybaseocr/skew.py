@@ -0,0 +1,133 @@
+"""
+Skew angle estimation.
+
+The skew angle is the rotation that maximizes the variance of the row
+means (the projection profile) of the inverted page: at the right angle,
+text lines and the gaps between them fall into separate rows.
+"""
+
+import numpy as np
+from scipy.ndimage import interpolation
+
+__all__ = ['rotation_variance', 'coarse_to_fine_skew', 'ForegroundProjection', 'SkewPrior']
+
+
+def rotation_variance(image, angle):
+    """Variance of the row means of `image` rotated by `angle` degrees."""
+    return np.var(np.mean(interpolation.rotate(
+        image, angle, order=0, mode='constant'), axis=1))
+
+
+def _downsample(image, factor):
+    """Mean over blocks of `factor` x `factor` pixels."""
+    h, w = image.shape[0] // factor, image.shape[1] // factor
+    return image[:h*factor, :w*factor].reshape(h, factor, w, factor).mean(axis=(1, 3))
+
+
+def coarse_to_fine_skew(image, angles, tolerance=0, factor=4):
+    """Estimate the skew angle of `image` among the equidistant `angles`.
+
+    All `angles` are first tried on a copy of `image` downsampled by
+    `factor`. Starting from the best of them, a hill climb at full
+    resolution then moves along the grid of `angles` to the local maximum,
+    and finally bisects the grid step until it is below `tolerance`.
+
+    This yields the same angle as trying all `angles` at full resolution
+    (up to the grid step or `tolerance`), but only needs a few full-size
+    rotations.
+    """
+    if len(angles) < 2:
+        return angles[0]
+    small = _downsample(image, factor) if min(image.shape) >= 64*factor else image
+    best = int(np.argmax([rotation_variance(small, a) for a in angles]))
+    step = angles[1] - angles[0]
+    lo, hi = angles[0], angles[-1]
+
+    scores = {}
+
+    def score(a):
+        a = round(a, 6)
+        if a not in scores:
+            scores[a] = rotation_variance(image, a)
+        return scores[a]
+
+    angle = angles[best]
+    while True:
+        candidates = [a for a in (angle - step, angle, angle + step) if lo <= a <= hi]
+        better = max(candidates, key=score)
+        if better == angle:
+            break
+        angle = better
+    while step > tolerance > 0:
+        step /= 2.0
+        angle = max((angle - step, angle, angle + step), key=score)
+    return angle
+
+
+class ForegroundProjection(object):
+    """Projection profiles of the foreground of a page under rotation.
+
+    Instead of rotating the page for every candidate angle, the coordinates
+    of the foreground pixels (above `threshold`, by default the midrange)
+    are rotated and binned into rows. On a binarized page, where the
+    foreground is a small fraction of all pixels, this is much cheaper than
+    `rotation_variance` and needs no page-sized intermediates.
+    """
+
+    def __init__(self, image, threshold=None):
+        if threshold is None:
+            threshold = 0.5*(np.amin(image)+np.amax(image))
+        self.shape = image.shape
+        ys, xs = np.nonzero(image > threshold)
+        self.ys = (ys - (self.shape[0]-1)/2.0).astype(np.float32)
+        self.xs = (xs - (self.shape[1]-1)/2.0).astype(np.float32)
+
+    def variance(self, angle):
+        """Equals `rotation_variance(image, angle)` on a binary image,
+        up to rounding of the rotated coordinates."""
+        a = np.deg2rad(angle)
+        c, s = np.cos(a), np.sin(a)
+        h, w = self.shape
+        # extent of the rotated page, as with interpolation.rotate(reshape=True)
+        rh = int(abs(h*c) + abs(w*s) + 0.5)
+        rw = int(abs(w*c) + abs(h*s) + 0.5)
+        rows = np.rint(self.ys*c - self.xs*s + (rh-1)/2.0).astype(np.intp)
+        counts = np.bincount(np.clip(rows, 0, rh-1), minlength=rh)
+        return np.var(counts/float(rw))
+
+    def skew(self, angles):
+        """Return the angle among `angles` with the highest variance."""
+        return angles[int(np.argmax([self.variance(a) for a in angles]))]
+
+
+class SkewPrior(object):
+    """Prior of the skew angle from the pages estimated so far.
+
+    Pages of the same book tend to have similar skew, so each page is first
+    searched in a `window` (degrees) around the median of the previous
+    angles. Only if the best angle lies on the edge of that window, i.e.
+    the peak is not inside it or the scores are flat, the full search runs.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.angles = []
+
+    def estimate(self, angles, score, search):
+        """Return the skew angle among `angles`.
+
+        `score(angle)` scores a single angle, `search(angles)` is the full
+        search used without prior or if the window is inconclusive.
+        """
+        angle = None
+        if self.angles:
+            prior = np.median(self.angles)
+            window = [a for a in angles if abs(a - prior) <= self.window]
+            if len(window) >= 3:
+                best = int(np.argmax([score(a) for a in window]))
+                if 0 < best < len(window) - 1:
+                    angle = window[best]
+        if angle is None:
+            angle = search(angles)
+        self.angles.append(angle)
+        return angle
@@ -0,0 +1,104 @@
+"""
+Page intensity statistics from fixed-bin histograms.
+
+Percentiles (e.g. the lo/hi estimates for normalization) are answered from
+a histogram that is filled in a single pass, possibly incrementally, so
+pages can be streamed tile by tile instead of sorting a raveled copy of
+all pixels for every percentile.
+"""
+
+import numpy as np
+from scipy.ndimage import filters, morphology
+
+__all__ = ['IntensityHistogram', 'local_deviation', 'estimation_mask', 'estimate_lo_hi']
+
+# rows added to a histogram at once, to bound temporary memory
+_CHUNK = 256
+
+
+class IntensityHistogram(object):
+    """Histogram of `bins` equidistant levels from `lo` to `hi` (inclusive).
+
+    Values are rounded to the nearest level, so percentiles are exact up to
+    half a bin width, `(hi-lo)/(bins-1)/2`.
+    """
+
+    def __init__(self, lo=0.0, hi=1.0, bins=4096):
+        self.lo = lo
+        self.hi = hi
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @classmethod
+    def from_values(cls, values, mask=None, bins=4096):
+        """Histogram of `values` (where `mask`) over their full range."""
+        hist = cls(float(np.amin(values)), float(np.amax(values)), bins)
+        for i in range(0, len(values), _CHUNK):
+            chunk = values[i:i+_CHUNK]
+            hist.add(chunk if mask is None else chunk[mask[i:i+_CHUNK]])
+        return hist
+
+    def add(self, values):
+        """Add an array of values in `[lo, hi]` (others are clipped)."""
+        scale = (self.bins - 1) / float(self.hi - self.lo) if self.hi > self.lo else 0.0
+        codes = np.rint((np.ravel(values) - self.lo) * scale)
+        self.add_codes(np.clip(codes, 0, self.bins - 1).astype(np.intp))
+
+    def add_codes(self, codes):
+        """Add an array of integer bin indices in `[0, bins)`."""
+        self.counts += np.bincount(np.ravel(codes), minlength=self.bins)[:self.bins]
+
+    def level(self, b):
+        return self.lo + b * (self.hi - self.lo) / float(self.bins - 1)
+
+    def percentile(self, q):
+        """Return the `q`-th percentile, interpolating between neighbouring
+        order statistics like `scipy.stats.scoreatpercentile`."""
+        n = self.total
+        if n == 0:
+            raise ValueError("percentile of an empty histogram")
+        cumsum = np.cumsum(self.counts)
+        idx = q / 100.0 * (n - 1)
+        k = int(idx)
+        b0, b1 = np.searchsorted(cumsum, [k, min(k + 1, n - 1)], side='right')
+        v0, v1 = self.level(b0), self.level(b1)
+        return v0 + (v1 - v0) * (idx - k)
+
+
+def local_deviation(est, escale):
+    """Local standard deviation of `est` at scale `escale`."""
+    v = est-filters.gaussian_filter(est, escale*20.0)
+    return filters.gaussian_filter(v**2, escale*20.0)**0.5
+
+
+def estimation_mask(est, escale, vmax=None):
+    """Mask of the regions of `est` that contain significant variance.
+
+    Percentile based low and high estimates are more reliable on these.
+    `vmax` is the maximum local deviation, if `est` is only part of a page.
+    """
+    v = local_deviation(est, escale)
+    if vmax is None:
+        vmax = np.amax(v)
+    v = (v > 0.3*vmax)
+    v = morphology.binary_dilation(
+        v, structure=np.ones((int(escale*50), 1)))
+    v = morphology.binary_dilation(
+        v, structure=np.ones((1, int(escale*50))))
+    return v
+
+
+def estimate_lo_hi(est, lo, hi, mask=None, bins=4096):
+    """Return the `lo` and `hi` percentiles of `est` (where `mask`).
+
+    If `mask` is empty (no significant variance, e.g. a blank page), all of
+    `est` is used instead.
+    """
+    hist = IntensityHistogram.from_values(est, mask, bins)
+    if hist.total == 0 and mask is not None:
+        hist = IntensityHistogram.from_values(est, None, bins)
+    return hist.percentile(lo), hist.percentile(hi)
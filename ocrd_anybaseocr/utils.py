@@ -0,0 +1,113 @@
+from collections import deque
+from multiprocessing import Pool
+from queue import Queue
+from threading import Thread
+
+import numpy as np
+import ocrolib
+from PIL import Image
+
+__all__ = ['imap_ordered', 'prefetch', 'tile_slices', 'read_image_gray']
+
+# full scale of the integer pixel types, as in ocrolib.read_image_gray
+_FULL_SCALE = {'uint8': 255.0, 'int8': 127.0, 'uint16': 65536.0, 'int16': 32767.0}
+
+
+def imap_ordered(func, jobs, processes=0, initializer=None, initargs=()):
+    """Apply `func` to every job of `jobs` on a pool of `processes` workers.
+
+    `jobs` yields `(context, args)` pairs. Only `args` is sent to the
+    workers; `context` stays in the calling process and is yielded back
+    together with the result, in job order, as `(context, result)`. At most
+    `2*processes` jobs are in flight at any time, so lazily generated jobs
+    are never materialized all at once.
+
+    With `processes < 2`, everything runs sequentially in the calling process.
+    """
+    if processes < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        for context, args in jobs:
+            yield context, func(*args)
+        return
+    with Pool(processes, initializer, initargs) as pool:
+        pending = deque()
+        for context, args in jobs:
+            pending.append((context, pool.apply_async(func, args)))
+            if len(pending) >= 2*processes:
+                context, result = pending.popleft()
+                yield context, result.get()
+        while pending:
+            context, result = pending.popleft()
+            yield context, result.get()
+
+
+def prefetch(iterable, size=1):
+    """Iterate over `iterable` in a background thread, which runs at most
+    `size` items ahead of the caller.
+
+    Exceptions raised by `iterable` are re-raised in the calling thread.
+    """
+    queue = Queue(size)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except Exception as err:
+            queue.put((done, err))
+        else:
+            queue.put((done, None))
+
+    Thread(target=produce, daemon=True).start()
+    while True:
+        item, err = queue.get()
+        if err is not None:
+            raise err
+        if item is done:
+            return
+        yield item
+
+
+def tile_slices(shape, size, halo=0, region=None):
+    """Cover `region` (a pair of slices, default: all of `shape`) with tiles.
+
+    Yields `(outer, inner)` pairs of slice tuples for every tile of at most
+    `size` x `size` pixels: `outer` is the tile extended by `halo` pixels on
+    each side (clipped to `region`) and indexes the full array, `inner` is
+    the tile proper relative to `outer`.
+    """
+    if region is None:
+        region = (slice(0, shape[0]), slice(0, shape[1]))
+    (y0, y1, _), (x0, x1, _) = [r.indices(n) for r, n in zip(region, shape)]
+    for ty in range(y0, y1, size):
+        for tx in range(x0, x1, size):
+            oy, ox = max(y0, ty - halo), max(x0, tx - halo)
+            ey, ex = min(y1, ty + size), min(x1, tx + size)
+            outer = (slice(oy, min(y1, ey + halo)), slice(ox, min(x1, ex + halo)))
+            inner = (slice(ty - oy, ey - oy), slice(tx - ox, ex - ox))
+            yield outer, inner
+
+
+def read_image_gray(filename, dtype='float64'):
+    """Read a grayscale image with values in [0, 1] as `dtype` array.
+
+    Same as `ocrolib.read_image_gray`, but for lower precisions the page is
+    converted straight from its pixel type, without a float64 copy, and
+    bilevel (mode '1') images are read as 0 and 1.
+    """
+    image = Image.open(filename)
+    if image.mode == '1':
+        # bilevel, as written by the binarizer
+        image = image.convert('L')
+    elif np.dtype(dtype) == np.float64:
+        return ocrolib.read_image_gray(filename)
+    a = ocrolib.pil2array(image)
+    if a.dtype.name in _FULL_SCALE:
+        a = np.divide(a, _FULL_SCALE[a.dtype.name], dtype=dtype)
+    else:
+        a = a.astype(dtype)
+    if a.ndim == 3:
+        a = a.mean(axis=2, dtype=dtype)
+    return a
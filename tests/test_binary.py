@@ -0,0 +1,51 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from ocrd_anybaseocr.binary import BinaryImage, midrange_threshold
+
+
+def read_image_binary(image):
+    """Foreground as in ocrolib's read_image_binary (inverted)."""
+    a = np.asarray(image.convert('L'), dtype=float)
+    return ~(a > 0.5*(np.amin(a) + np.amax(a)))
+
+
+def page(seed=0):
+    """Gray page with anti-aliased strokes and a light background texture."""
+    rng = np.random.RandomState(seed)
+    a = 200 + rng.randint(0, 40, (120, 160))
+    a[30:40, 20:140] = 20
+    a[29, 20:140] = a[40, 20:140] = 120
+    a[60:100, 70:75] = 127
+    return Image.fromarray(a.astype(np.uint8))
+
+
+def jpeg(image, quality=30):
+    data = BytesIO()
+    image.save(data, 'JPEG', quality=quality)
+    return Image.open(BytesIO(data.getvalue()))
+
+
+def test_midrange_of_gray_page():
+    image = page()
+    binary = BinaryImage.from_pil(image, midrange_threshold(image)).array
+    assert np.array_equal(binary, read_image_binary(image))
+    # the background texture is not foreground, unlike with the default threshold
+    assert not binary[0:20].any()
+    assert BinaryImage.from_pil(image).array[0:20].any()
+
+
+def test_midrange_of_jpeg_pages():
+    for seed in range(5):
+        image = jpeg(page(seed))
+        binary = BinaryImage.from_pil(image, midrange_threshold(image)).array
+        assert np.array_equal(binary, read_image_binary(image))
+
+
+def test_midrange_of_bilevel_page():
+    image = page().point(lambda v: 255 if v > 128 else 0).convert('1')
+    binary = BinaryImage.from_pil(image, midrange_threshold(image)).array
+    assert np.array_equal(binary, BinaryImage.from_pil(image).array)
+    assert np.array_equal(binary, read_image_binary(image))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('ocrd')
+from ocrd_anybaseocr.cli.ocrd_anybaseocr_cropping import (  # noqa: E402
+    OcrdAnybaseocrCropper, _edge_position, _proxy_scales, _to_full)
+
+
+def page(frame, shape=(1201, 901)):
+    """Gray image, white outside and dark inside the `frame` boundaries."""
+    x0, y0, x1, y1 = frame
+    image = np.full(shape, 230, np.uint8)
+    image[y0:y1, x0:x1] = 40
+    return image
+
+
+def proxy(image, long_edge):
+    scale = float(long_edge) / max(image.shape)
+    return cv2.resize(image, (int(round(image.shape[1]*scale)), int(round(image.shape[0]*scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+@pytest.mark.parametrize('offset', range(4))
+def test_proxy_edges_map_onto_full_resolution_edges(offset):
+    image = page((200 + offset, 300 + offset, 700 + offset, 900 + offset))
+    small = proxy(image, 400)
+    sx, sy = _proxy_scales(image, small)
+    for axis, pos, extent, s, t in [(0, 200, (300, 900), sx, sy), (1, 300, (200, 700), sy, sx)]:
+        full = _edge_position(image, axis, pos, extent, 8)
+        assert full == pos + offset - 0.5
+        edge = _edge_position(small, axis, int(round(pos*s)),
+                              [int(round(e*t)) for e in extent], 3)
+        assert abs(_to_full(edge, s) - full) < 0.1
+
+
+@pytest.mark.parametrize('offset', range(4))
+def test_refined_border_is_true_edge(offset):
+    frame = [200 + offset, 300 + offset, 700 + offset, 900 + offset]
+    image = page(frame)
+    small = proxy(image, 400)
+    sx, sy = _proxy_scales(image, small)
+    # the frame as found on the proxy, mapped back
+    border = [int(round(round(c*s)/s)) for c, s in zip(frame, (sx, sy, sx, sy))]
+    cropper = OcrdAnybaseocrCropper(None, parameter={})
+    assert cropper.refine_border(image, small, border, 8) == frame
+
+
+def test_whole_page_maps_onto_whole_page():
+    image = page((0, 0, 0, 0))
+    small = proxy(image, 400)
+    sx, sy = _proxy_scales(image, small)
+    corners = [0, 0, small.shape[1], small.shape[0]]
+    border = [int(round(_to_full(c - 0.5, s) + 0.5)) for c, s in zip(corners, (sx, sy, sx, sy))]
+    assert border == [0, 0, image.shape[1], image.shape[0]]
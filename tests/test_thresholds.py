@@ -0,0 +1,27 @@
+import numpy as np
+
+from ocrd_anybaseocr.thresholds import IntensityHistogram, estimation_mask, estimate_lo_hi
+
+
+def test_percentile_matches_numpy():
+    values = np.random.RandomState(0).rand(300, 200)
+    hist = IntensityHistogram.from_values(values, bins=65536)
+    for q in (0, 5, 50, 90, 100):
+        assert abs(hist.percentile(q) - np.percentile(values, q)) < 1e-4
+
+
+def test_lo_hi_of_blank_page():
+    est = np.ones((300, 200))
+    mask = estimation_mask(est, 1.0)
+    assert not mask.any()
+    lo, hi = estimate_lo_hi(est, 5, 90, mask)
+    assert lo == hi == 1.0
+
+
+def test_lo_hi_where_masked():
+    est = np.full((300, 200), 0.9)
+    est[100:200, 50:150:4] = 0.1
+    mask = np.zeros(est.shape, bool)
+    mask[100:200, 50:150] = True
+    lo, hi = estimate_lo_hi(est, 5, 90, mask)
+    assert abs(lo - 0.1) < 1e-3 and abs(hi - 0.9) < 1e-3